@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import tournament
+from bitboard import Board
+from players import ComputerPlayer, MIN, MAX
+from tictactoe import Game, IN_PROGRESS
+from transposition import TranspositionTable
+
+"""
+A benchmark suite for the search and game-loop hot paths
+
+Each benchmark measures one number, repeats the measurement and keeps the best repeat to reduce noise. The results are
+written as JSON and can be compared against a stored baseline, failing when any benchmark regressed by more than a
+threshold. Typical use is
+
+    python3 benchmark.py --save-baseline benchmark_baseline.json   # once, on the reference version
+    python3 benchmark.py --baseline benchmark_baseline.json         # after every change
+"""
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.25  # The fraction a benchmark may get worse by before the comparison fails
+DEFAULT_REPEATS = 5
+MIN_MEASURED_NODES = 50000  # The number of nodes each repeat of the nodes per second benchmark searches at least
+
+
+def best_time(function, repeats):
+    """
+    :return: The smallest number of seconds function() took over the repeats
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def opening_line():
+    """
+    :return: The cells of a game between two computer players, which ends in a draw after every cell is filled.
+             Its first move_count moves give a position that is still in progress for every move_count from 0 to 8
+    """
+    game = Game("cpu", "cpu")
+    cells = []
+    while game.status == IN_PROGRESS:
+        row, col = game.play_move()
+        cells.append(game.geometry.cell_index(row, col))
+    return cells
+
+
+def position_after(cells, move_count):
+    board = Board()
+    for i, cell in enumerate(cells[:move_count]):
+        board.place(*board.geometry.cell_coords[cell], "X" if i % 2 == 0 else "O")
+    return board
+
+
+def bench_move_latency(cells, letter, move_count, repeats):
+    """
+    Measures get_next_move on the position after move_count moves of cells, with a new transposition table on every
+    repeat so that nothing is remembered from earlier searches
+    """
+    board = position_after(cells, move_count)
+
+    def search():
+        ComputerPlayer(0, "cpu", letter, table=TranspositionTable()).get_next_move(board, move_count)
+    return best_time(search, repeats)
+
+
+def mid_game_positions():
+    """
+    :return: A list of the 72 positions after one move by X and one reply by O, with X to move
+    """
+    positions = []
+    for x_cell in range(9):
+        for o_cell in range(9):
+            if o_cell != x_cell:
+                board = Board()
+                board.make_move(x_cell, "X")
+                board.make_move(o_cell, "O")
+                positions.append(board)
+    return positions
+
+
+def bench_nodes_per_second(repeats):
+    """
+    Measures the rate at which minimax visits nodes when searching a fixed set of mid-game positions without a
+    transposition table. The set is searched as many times as it takes to visit MIN_MEASURED_NODES nodes per repeat,
+    so the measurement stays well above the resolution of the timer however much the search prunes
+    """
+    player = ComputerPlayer(0, "cpu", "X", table=None)
+    positions = mid_game_positions()
+
+    def search_positions():
+        for board in positions:
+            player.minimax(board, 7, True, "X", MIN, MAX)
+    search_positions()
+    rounds = -(-MIN_MEASURED_NODES // player.nodes_searched)  # The number of searches of the set that visit enough nodes
+
+    def search():
+        for _ in range(rounds):
+            search_positions()
+    player.nodes_searched = 0
+    elapsed = best_time(search, repeats)
+    return player.nodes_searched / repeats / elapsed
+
+
+def sample_positions(cells):
+    """
+    :return: A list of (board, row, col, move_count) tuples for every non-empty prefix of cells
+    """
+    positions = []
+    for move_count in range(1, len(cells) + 1):
+        row, col = Board().geometry.cell_coords[cells[move_count - 1]]
+        positions.append((position_after(cells, move_count), row, col, move_count))
+    return positions
+
+
+def bench_evaluate_board(cells, repeats, calls=20000):
+    """
+    Measures evaluate_board calls per second on bitboards
+    """
+    player = ComputerPlayer(0, "cpu", "X")
+    boards = [(board, 9 - move_count) for board, _, _, move_count in sample_positions(cells)]
+    rounds = calls // len(boards)
+
+    def evaluate():
+        for _ in range(rounds):
+            for board, depth in boards:
+                player.evaluate_board(board, depth)
+    return rounds * len(boards) / best_time(evaluate, repeats)
+
+
+def bench_check_status(cells, repeats, calls=20000):
+    """
+    Measures Game.check_status calls per second
+    """
+    game = Game("player 1", "player 2")
+    positions = sample_positions(cells)
+    rounds = calls // len(positions)
+
+    def check():
+        for _ in range(rounds):
+            for board, row, col, move_count in positions:
+                game.bitboard = board
+                game.move_count = move_count
+                game.check_status(row, col)
+    return rounds * len(positions) / best_time(check, repeats)
+
+
+def bench_games_per_second(repeats, games=200):
+    """
+    Measures headless games between two computer players per second in this process, after a warm-up game has filled the
+    shared transposition table
+    """
+    config = {"player_1": "cpu", "player_2": "cpu", "rows": 3, "cols": 3, "win_length": None, "time_limit": None, "seed": 0}
+    tournament.play_games(config, 0, 1)
+    return games / best_time(lambda: tournament.play_games(config, 0, games), repeats)
+
+
+def run_benchmarks(repeats=DEFAULT_REPEATS):
+    """
+    Runs every benchmark
+    :return: A dict mapping each benchmark name to a dict with its value, unit and whether higher values are better
+    """
+    cells = opening_line()
+    results = {}
+    for move_count in range(9):  # Only the side to move is timed, since the other letter never moves in that position
+        letter = "X" if move_count % 2 == 0 else "O"
+        name = "get_next_move_latency_" + letter + "_" + str(move_count)
+        results[name] = {"value": bench_move_latency(cells, letter, move_count, repeats), "unit": "s", "higher_is_better": False}
+    results["minimax_nodes_per_second"] = {"value": bench_nodes_per_second(repeats), "unit": "nodes/s", "higher_is_better": True}
+    results["evaluate_board_per_second"] = {"value": bench_evaluate_board(cells, repeats), "unit": "calls/s", "higher_is_better": True}
+    results["check_status_per_second"] = {"value": bench_check_status(cells, repeats), "unit": "calls/s", "higher_is_better": True}
+    results["cpu_vs_cpu_games_per_second"] = {"value": bench_games_per_second(repeats), "unit": "games/s", "higher_is_better": True}
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares benchmark results against a baseline
+    :param results: A dict returned by run_benchmarks()
+    :param baseline: A dict returned by run_benchmarks() for the reference version
+    :param threshold: The fraction a benchmark may get worse by before it counts as a regression
+    :return: A list of (name, baseline value, new value, fraction worse) tuples for every regression. Benchmarks missing
+             from either dict are ignored
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        if old <= 0:
+            continue
+        worse = (old - new) / old if result["higher_is_better"] else (new - old) / old
+        if worse > threshold:
+            regressions.append((name, old, new, worse))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the search and game-loop hot paths")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against the results stored at this path. Defaults to " +
+                        DEFAULT_BASELINE + " if it exists")
+    parser.add_argument("--save-baseline", help="Store the results as the baseline at this path")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="The fraction a benchmark may get worse by before failing")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "platform": platform.platform(), "benchmarks": run_benchmarks(args.repeats)}
+    for name, result in report["benchmarks"].items():
+        print(name + ": " + format(result["value"], ".6g") + " " + result["unit"])
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    baseline_path = args.baseline
+    if baseline_path is None and os.path.exists(DEFAULT_BASELINE) and not args.save_baseline:
+        baseline_path = DEFAULT_BASELINE
+    if baseline_path is None:
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)["benchmarks"]
+    regressions = compare(report["benchmarks"], baseline, args.threshold)
+    for name, old, new, worse in regressions:
+        print("REGRESSION " + name + ": " + format(old, ".6g") + " -> " + format(new, ".6g") +
+              " (" + format(worse * 100, ".1f") + "% worse)")
+    if regressions:
+        return 1
+    print("No benchmark regressed by more than " + format(args.threshold * 100, ".0f") + "%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
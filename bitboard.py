@@ -0,0 +1,338 @@
+EMPTY = "-"
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))  # Rows, columns, diagonals from top-left to bottom-right and from top-right to bottom-left
+MAX_CHUNK_BITS = 10  # Masks are transformed by symmetries up to this many cells at a time, through a lookup table per chunk
+
+
+class Geometry:
+    """
+    A class to represent the shape of a board: the number of rows and columns, and how many of the same letter in a
+    row, column or diagonal win the game. It precomputes the masks every Board of this shape uses. Use get_geometry()
+    rather than creating instances directly so that boards of the same shape share one Geometry
+    """
+    def __init__(self, rows, cols, win_length, index):
+        """
+        :param rows: The number of rows on the board
+        :param cols: The number of columns on the board
+        :param win_length: The number of the same letter in a line required to win
+        :param index: A small integer that is unique to this geometry, used to tell positions on different geometries apart
+        """
+        if rows < 1 or cols < 1:
+            raise ValueError("A board needs at least one row and one column")
+        if not 1 <= win_length <= max(rows, cols):
+            raise ValueError("win_length must be between 1 and the longest side of the board")
+        self.rows = rows
+        self.cols = cols
+        self.win_length = win_length
+        self.index = index
+        self.num_cells = rows * cols
+        self.full_mask = (1 << self.num_cells) - 1  # A mask with every cell of the board set
+        self.cell_bits = tuple(1 << cell for cell in range(self.num_cells))  # cell_bits[i] is the mask with only cell i set
+        self.cell_coords = tuple(divmod(cell, cols) for cell in range(self.num_cells))  # cell_coords[i] is the (row, col) of cell i
+
+        win_masks = []  # Every combination of win_length cells in a line, which are required to be the same letter for the game to be won
+        for dr, dc in DIRECTIONS:
+            for r in range(rows):
+                for c in range(cols):
+                    end_r, end_c = r + dr * (win_length - 1), c + dc * (win_length - 1)
+                    if 0 <= end_r < rows and 0 <= end_c < cols:
+                        win_masks.append(sum(1 << self.cell_index(r + dr * i, c + dc * i) for i in range(win_length)))
+        self.win_masks = tuple(win_masks)
+        self.lines_through_cell = tuple(tuple(w for w in self.win_masks if w & bit) for bit in self.cell_bits)  # The win masks that contain each cell
+        self.line_indices_through_cell = tuple(
+            tuple(i for i, w in enumerate(self.win_masks) if w & bit) for bit in self.cell_bits
+        )  # The indices in win_masks of the lines that contain each cell
+        self.cell_weights = tuple(len(lines) for lines in self.lines_through_cell)  # The number of win lines through each cell
+        # The cells from the most to the fewest win lines through them, which on a 3x3 board is the center, then the
+        # corners, then the edges. Ties are in row-major order
+        self.cell_order = tuple(sorted(range(self.num_cells), key=lambda cell: -self.cell_weights[cell]))
+
+        # The rotations and reflections that map the board onto itself, as permutations where symmetry[cell] is the cell
+        # that cell is moved to. The identity is first. Square boards have 8 and other boards have 4. Every one maps win
+        # lines to win lines, so positions related by a symmetry have the same value
+        transforms = [lambda r, c: (r, c), lambda r, c: (rows - 1 - r, cols - 1 - c),
+                      lambda r, c: (r, cols - 1 - c), lambda r, c: (rows - 1 - r, c)]
+        if rows == cols:
+            transforms += [lambda r, c: (c, r), lambda r, c: (cols - 1 - c, rows - 1 - r),
+                           lambda r, c: (c, rows - 1 - r), lambda r, c: (cols - 1 - c, r)]
+        self.symmetries = tuple(tuple(self.cell_index(*transform(r, c)) for r, c in self.cell_coords) for transform in transforms)
+        self.inverse_symmetries = tuple(tuple(symmetry.index(cell) for cell in range(self.num_cells)) for symmetry in self.symmetries)
+        # symmetry_tables[s][i][chunk] is the image under symmetry s of the cells of the i-th chunk of chunk_bits cells of
+        # a mask that are set in chunk, so a mask is transformed with one lookup per chunk instead of one step per set
+        # cell. A 3x3 board is a single chunk
+        self.chunk_bits = min(self.num_cells, MAX_CHUNK_BITS)
+        num_chunks = (self.num_cells + self.chunk_bits - 1) // self.chunk_bits
+        self.symmetry_tables = tuple(tuple(self.chunk_table(symmetry, i * self.chunk_bits) for i in range(num_chunks))
+                                     for symmetry in self.symmetries)
+
+    def chunk_table(self, symmetry, first_cell):
+        """
+        :return: A list of the image under symmetry of every combination of the chunk_bits cells starting at first_cell.
+                 See self.symmetry_tables
+        """
+        images = [1 << symmetry[cell] if cell < self.num_cells else 0 for cell in range(first_cell, first_cell + self.chunk_bits)]
+        table = [0] * (1 << self.chunk_bits)
+        for chunk in range(1, 1 << self.chunk_bits):
+            low = chunk & -chunk
+            table[chunk] = table[chunk ^ low] | images[low.bit_length() - 1]
+        return table
+
+    def cell_index(self, row, col):
+        """
+        Converts a zero-indexed row and column into the index of the matching bit in a board mask
+        """
+        return row * self.cols + col
+
+    def has_line(self, mask):
+        """
+        Determines if a player's mask contains a complete win line
+        :param mask: An integer whose set bits are the cells occupied by one player
+        :return: True if every cell of at least one win line is set in mask
+        """
+        for win_mask in self.win_masks:
+            if mask & win_mask == win_mask:
+                return True
+        return False
+
+    def completes_line(self, mask, cell):
+        """
+        Determines if the piece at cell completed a win line for the player owning mask. Only the lines through
+        cell are checked, which is all that can change after a single move
+        :param mask: An integer whose set bits are the cells occupied by one player, including cell
+        :param cell: The index of the cell that was just played
+        :return: True if one of the lines through cell is complete
+        """
+        for win_mask in self.lines_through_cell[cell]:
+            if mask & win_mask == win_mask:
+                return True
+        return False
+
+    def transform(self, mask, symmetry):
+        """
+        :param mask: A player's mask
+        :param symmetry: The index of a symmetry in self.symmetries
+        :return: The mask with every set cell moved to its image under the symmetry
+        """
+        tables = self.symmetry_tables[symmetry]
+        if len(tables) == 1:
+            return tables[0][mask]
+        chunk_mask = (1 << self.chunk_bits) - 1
+        result = 0
+        for table in tables:
+            result |= table[mask & chunk_mask]
+            mask >>= self.chunk_bits
+        return result
+
+    def kept_symmetries(self, x_mask, o_mask):
+        """
+        Finds the symmetries that map a position onto itself, such as the reflection in the main diagonal after a first
+        move in a corner. Moves that one of them maps onto each other lead to positions with the same value
+        :return: A list of the symmetries other than the identity, as permutations of the cells, that leave both masks
+                 unchanged. Together with the identity they are closed under composition
+        """
+        if len(self.symmetry_tables[0]) == 1:  # The whole board is one chunk, so each mask is transformed with one lookup
+            return [symmetry for symmetry, (table,) in zip(self.symmetries[1:], self.symmetry_tables[1:])
+                    if table[x_mask] == x_mask and table[o_mask] == o_mask]
+        return [self.symmetries[index] for index in range(1, len(self.symmetries))
+                if self.transform(x_mask, index) == x_mask and self.transform(o_mask, index) == o_mask]
+
+    def canonical(self, x_mask, o_mask):
+        """
+        Finds the canonical form of a position, which is the same for every position related to it by a symmetry
+        :return: A tuple of the x and o masks of the canonical position, and the index in self.symmetries of the
+                 symmetry that maps the given position to it
+        """
+        best = None
+        for index in range(len(self.symmetries)):
+            masks = (self.transform(x_mask, index), self.transform(o_mask, index))
+            if best is None or masks < best:
+                best, best_index = masks, index
+        return best[0], best[1], best_index
+
+    def __reduce__(self):
+        # Unpickling looks the shape up with get_geometry(), so boards sent to another process share its Geometry
+        return get_geometry, (self.rows, self.cols, self.win_length)
+
+    def __repr__(self):
+        return "Geometry(" + str(self.rows) + ", " + str(self.cols) + ", " + str(self.win_length) + ")"
+
+
+geometries = {}  # Maps (rows, cols, win_length) to the shared Geometry of that shape
+
+
+def get_geometry(rows=3, cols=3, win_length=None):
+    """
+    Returns the Geometry of the given shape, creating it the first time it is requested
+    :param win_length: The number in a row required to win. Defaults to the length of the shorter side of the board
+    """
+    if win_length is None:
+        win_length = min(rows, cols)
+    key = (rows, cols, win_length)
+    if key not in geometries:
+        geometries[key] = Geometry(rows, cols, win_length, len(geometries))
+    return geometries[key]
+
+
+STANDARD = get_geometry(3, 3, 3)  # The standard 3x3 board where 3 in a row wins
+
+# The shape of the standard board, for code that only supports 3x3 boards
+NUM_ROWS = STANDARD.rows
+NUM_COLS = STANDARD.cols
+NUM_CELLS = STANDARD.num_cells
+FULL_MASK = STANDARD.full_mask
+CELL_BITS = STANDARD.cell_bits
+CELL_COORDS = STANDARD.cell_coords
+WIN_MASKS = STANDARD.win_masks
+LINES_THROUGH_CELL = STANDARD.lines_through_cell
+cell_index = STANDARD.cell_index
+has_line = STANDARD.has_line
+completes_line = STANDARD.completes_line
+
+
+class Board:
+    """
+    A class to represent a Tic Tac Toe board as two bitboards, one integer mask per player. Bit i of a mask
+    is set when that player occupies cell i, where cells are numbered row by row starting from the top left.
+    The board also keeps, for each player, the number of cells it occupies in every win line. make_move() and
+    unmake_move() update the masks and counts in constant time, so a win is found by checking whether one of the
+    lines through the played cell reached the win length, without rescanning the board.
+    The list-of-lists view used for printing is available through to_rows() and from_rows()
+    """
+    __slots__ = ("x_mask", "o_mask", "geometry", "x_counts", "o_counts")
+
+    def __init__(self, x_mask=0, o_mask=0, geometry=STANDARD):
+        """
+        :param x_mask: An integer whose set bits are the cells occupied by 'X'
+        :param o_mask: An integer whose set bits are the cells occupied by 'O'
+        :param geometry: The Geometry of the board. Defaults to the standard 3x3 board
+        """
+        self.x_mask = x_mask
+        self.o_mask = o_mask
+        self.geometry = geometry
+        self.x_counts = [bin(x_mask & w).count("1") for w in geometry.win_masks]  # x_counts[i] is the number of 'X' in win line i
+        self.o_counts = [bin(o_mask & w).count("1") for w in geometry.win_masks]
+
+    @classmethod
+    def from_rows(cls, rows, win_length=None):
+        """
+        Creates a Board from a matrix of characters, either '-', 'X', or 'O'
+        :param win_length: The number in a row required to win. Defaults to the length of the shorter side of the board
+        """
+        geometry = get_geometry(len(rows), len(rows[0]), win_length)
+        x_mask = o_mask = 0
+        for r in range(geometry.rows):
+            for c in range(geometry.cols):
+                if rows[r][c] == "X":
+                    x_mask |= 1 << geometry.cell_index(r, c)
+                elif rows[r][c] == "O":
+                    o_mask |= 1 << geometry.cell_index(r, c)
+        return cls(x_mask, o_mask, geometry)
+
+    def to_rows(self):
+        """
+        :return: A new matrix of characters, either '-', 'X', or 'O', representing this board
+        """
+        return [[self.get(r, c) for c in range(self.geometry.cols)] for r in range(self.geometry.rows)]
+
+    def get(self, row, col):
+        """
+        :return: The letter at the given zero-indexed row and column, or '-' if the cell is unoccupied
+        """
+        bit = 1 << self.geometry.cell_index(row, col)
+        if self.x_mask & bit:
+            return "X"
+        if self.o_mask & bit:
+            return "O"
+        return EMPTY
+
+    def is_empty(self, row, col):
+        return not (self.x_mask | self.o_mask) & (1 << self.geometry.cell_index(row, col))
+
+    def place(self, row, col, letter):
+        """
+        Enters letter at the given zero-indexed row and column. The cell is assumed to be unoccupied
+        :return: True if the move completed a win line for letter
+        """
+        return self.make_move(self.geometry.cell_index(row, col), letter)
+
+    def make_move(self, cell, letter):
+        """
+        Enters letter at a cell and updates the line counts of letter. The cell is assumed to be unoccupied
+        :param cell: The index of the cell
+        :param letter: Either 'X' or 'O'
+        :return: True if the move completed a win line for letter
+        """
+        if letter == "X":
+            self.x_mask |= 1 << cell
+            counts = self.x_counts
+        else:
+            self.o_mask |= 1 << cell
+            counts = self.o_counts
+        win_length = self.geometry.win_length
+        won = False
+        for line in self.geometry.line_indices_through_cell[cell]:
+            counts[line] += 1
+            if counts[line] == win_length:
+                won = True
+        return won
+
+    def unmake_move(self, cell, letter):
+        """
+        Removes letter from a cell, undoing make_move(cell, letter)
+        """
+        if letter == "X":
+            self.x_mask &= ~(1 << cell)
+            counts = self.x_counts
+        else:
+            self.o_mask &= ~(1 << cell)
+            counts = self.o_counts
+        for line in self.geometry.line_indices_through_cell[cell]:
+            counts[line] -= 1
+
+    def completes_line(self, cell, letter):
+        """
+        :return: True if one of the win lines through cell is complete for letter
+        """
+        counts = self.x_counts if letter == "X" else self.o_counts
+        win_length = self.geometry.win_length
+        for line in self.geometry.line_indices_through_cell[cell]:
+            if counts[line] == win_length:
+                return True
+        return False
+
+    def mask_for(self, letter):
+        """
+        :return: The mask of the cells occupied by letter
+        """
+        return self.x_mask if letter == "X" else self.o_mask
+
+    def counts_for(self, letter):
+        """
+        :return: The list of the number of cells letter occupies in each win line
+        """
+        return self.x_counts if letter == "X" else self.o_counts
+
+    def occupied(self):
+        return self.x_mask | self.o_mask
+
+    def is_full(self):
+        return self.occupied() == self.geometry.full_mask
+
+    def has_won(self, letter):
+        return self.geometry.win_length in self.counts_for(letter)
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.x_mask, board.o_mask, board.geometry = self.x_mask, self.o_mask, self.geometry
+        board.x_counts, board.o_counts = list(self.x_counts), list(self.o_counts)
+        return board
+
+    def __eq__(self, other):
+        if isinstance(other, Board):
+            return self.x_mask == other.x_mask and self.o_mask == other.o_mask and self.geometry is other.geometry
+        if isinstance(other, list):
+            return self.to_rows() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return "Board(" + str(self.to_rows()) + ")"
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from bitboard import get_geometry
+from players import LearnerPlayer
+from tictactoe import Game, IN_PROGRESS, WON
+from vecenv import BatchEnv
+
+"""
+A table of position values learned through self-play, for LearnerPlayer
+
+The table holds one value per position, for the player who made the last move: 1 for a won game, 0 for a draw and -1
+for a lost game. On boards with at most 11 cells every position has its own entry, and on larger boards positions are
+hashed into 2 ** hash_bits entries. Training plays many games at once in a vecenv.BatchEnv, which applies
+the rules of Game.update_board and Game.check_status to every board in a few NumPy operations, so no Game, Board or
+Player objects are created per move. Train, save and evaluate a table with
+
+    python3 learner.py --games 1000000 --path learner.npz
+"""
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "learner.npz")
+DEFAULT_HASH_BITS = 22  # The number of index bits of the table on boards too large to give every position its own entry
+DEFAULT_BATCH_SIZE = 32768  # The number of games training plays at once
+DEFAULT_LEARNING_RATE = 0.2
+DEFAULT_EXPLORATION = 0.3  # The probability of a random move instead of the best one during training
+UNSEEN_VALUE = -0.1  # The value of a position training has not reached, so a player prefers a known draw to it
+BLOCKED_PENALTY = -4.0  # Added to the value of a move to an occupied cell during training, which puts it below every value
+HASH_SEED = 0x5EED  # The seed of the random keys that positions on large boards are hashed with
+
+
+class ValueTable:
+    """
+    A class to represent the learned values of the positions of one board shape. A position is identified by the XOR
+    of a key for every occupied cell and letter, so the key of the position after a move is the key before it XOR the
+    key of the move. On small boards the key of 'X' at cell i is bit i and the key of 'O' is bit num_cells + i, which
+    makes the key the x mask followed by the o mask. On larger boards the keys are random and the index of a position
+    is the top hash_bits bits of its key
+    """
+    def __init__(self, rows=3, cols=3, win_length=None, hash_bits=DEFAULT_HASH_BITS):
+        """
+        :param rows: The number of rows on the board
+        :param cols: The number of columns on the board
+        :param win_length: The number in a row needed to win. Defaults to the shorter side of the board
+        :param hash_bits: The table has 2 ** hash_bits entries on boards whose positions do not each get their own entry
+        """
+        self.geometry = get_geometry(rows, cols, win_length)
+        if self.geometry.num_cells > 64:
+            raise ValueError("ValueTable supports boards with at most 64 cells")
+        num_cells = self.geometry.num_cells
+        self.exact = 2 * num_cells <= hash_bits  # Whether every position has its own entry
+        if self.exact:
+            self.bits = 2 * num_cells
+            self.keys = np.array([[1 << cell for cell in range(num_cells)], [1 << (num_cells + cell) for cell in range(num_cells)]],
+                                 dtype=np.uint64)
+        else:
+            self.bits = hash_bits
+            self.keys = np.random.default_rng(HASH_SEED).integers(0, 1 << 64, (2, num_cells), dtype=np.uint64, endpoint=False)
+        self.shift = 64 - self.bits if not self.exact else 0  # The key of a position is shifted right by this much to give its index
+        self.key_lists = self.keys.tolist()  # The keys as Python integers, for looking up single positions
+        self.values = np.full(1 << self.bits, UNSEEN_VALUE, dtype=np.float32)
+        self.games = 0  # The number of training games played into the table
+
+    def key(self, x_mask, o_mask):
+        """
+        :return: The key of a position
+        """
+        key = 0
+        for mask, keys in ((x_mask, self.key_lists[0]), (o_mask, self.key_lists[1])):
+            while mask:
+                low = mask & -mask
+                key ^= keys[low.bit_length() - 1]
+                mask ^= low
+        return key
+
+    def best_move(self, x_mask, o_mask, letter):
+        """
+        Chooses the move that leads to the position with the highest value, reading the values of every move in one
+        lookup. Ties go to the first cell in row-major order
+        :param letter: The letter of the player to move
+        :return: The cell index of the move
+        """
+        geometry = self.geometry
+        occupied = x_mask | o_mask
+        cells = [cell for cell in range(geometry.num_cells) if not occupied & geometry.cell_bits[cell]]
+        key = self.key(x_mask, o_mask)
+        move_keys = self.key_lists[0 if letter == "X" else 1]
+        return cells[int(self.values[[(key ^ move_keys[cell]) >> self.shift for cell in cells]].argmax())]
+
+    def save(self, path=DEFAULT_PATH):
+        """
+        Writes the table to a checkpoint file. The file is replaced atomically, so a crash during the write leaves the
+        previous checkpoint intact
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, shape=np.array([self.geometry.rows, self.geometry.cols, self.geometry.win_length, self.bits]),
+                     games=np.array(self.games), keys=self.keys, values=self.values)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """
+        Reads a table written by save()
+        """
+        with np.load(path) as data:
+            rows, cols, win_length, bits = (int(value) for value in data["shape"])
+            table = cls(rows, cols, win_length, bits)
+            if table.bits != bits or data["values"].shape != table.values.shape:
+                raise ValueError(path + " does not hold a table of the expected size")
+            table.keys = data["keys"]
+            table.key_lists = table.keys.tolist()
+            table.values = data["values"]
+            table.games = int(data["games"])
+        return table
+
+
+def train(table, num_games, batch_size=DEFAULT_BATCH_SIZE, learning_rate=DEFAULT_LEARNING_RATE,
+          exploration=DEFAULT_EXPLORATION, seed=None, checkpoint_path=None, checkpoint_every=None):
+    """
+    Trains a table by self-play. Both players choose the move to the position with the highest value, or a random move
+    with probability exploration. Before every move the value of the position, for the player who moved to it, is moved
+    towards the negation of the best value the player to move can reach from it, and a position that ends the game
+    gets its result. The key of every board is updated with one XOR per move, so the values of every move of every
+    board are read in one lookup
+
+    :param table: The ValueTable to train
+    :param num_games: The number of games to play. Games are played batch_size at a time, and boards that finish a
+                      game start a new one, so a few more games than this may be played
+    :param batch_size: The number of games played at once
+    :param learning_rate: The fraction of the difference to the new estimate each update moves a value by
+    :param exploration: The probability of a random move
+    :param seed: The seed of the random moves, or None for unseeded training
+    :param checkpoint_path: An optional path the table is saved to every checkpoint_every games and at the end
+    :param checkpoint_every: The number of games between checkpoints. Defaults to only saving at the end
+    :return: A dict with the number of games played, the elapsed seconds and the games per second
+    """
+    rng = np.random.default_rng(seed)
+    geometry = table.geometry
+    env = BatchEnv(batch_size, geometry.rows, geometry.cols, geometry.win_length)
+    values = table.values
+    shift = np.uint64(table.shift)
+    boards = np.arange(batch_size)
+    keys = np.zeros(batch_size, dtype=np.uint64)  # The key of the position on every board
+    blocked = np.zeros((batch_size, geometry.num_cells), dtype=np.float32)  # BLOCKED_PENALTY at the occupied cells of every board
+    previous = np.full(batch_size, -1, dtype=np.intp)  # The index of the position on every board, or -1 on an empty board
+    games = 0
+    next_checkpoint = checkpoint_every
+    start = time.perf_counter()
+    while games < num_games:
+        # The value of every move of every board, with the moves to occupied cells pushed below every legal move
+        move_keys = keys[:, None] ^ table.keys[env.move_count & 1]
+        indices = (move_keys >> shift if table.shift else move_keys).view(np.intp)  # Indices are below 2 ** 63, so the bits are reused as is
+        move_values = values[indices] + blocked
+        moves = move_values.argmax(axis=1)
+
+        moved = previous >= 0
+        values[previous[moved]] += learning_rate * (-move_values[boards, moves][moved] - values[previous[moved]])
+
+        explore = rng.random(batch_size) < exploration
+        if explore.any():
+            random_keys = rng.random((int(explore.sum()), geometry.num_cells))
+            random_keys += blocked[explore]
+            moves[explore] = random_keys.argmax(axis=1)
+        env.step(moves)
+        keys = move_keys[boards, moves]
+        previous = indices[boards, moves]
+        blocked[boards, moves] = BLOCKED_PENALTY
+
+        done = env.status != IN_PROGRESS
+        if done.any():
+            values[previous[done]] = np.where(env.status[done] == WON, 1.0, 0.0)
+            previous[done] = -1
+            keys[done] = 0
+            blocked[done] = 0.0
+            env.reset(done)
+            finished = int(done.sum())
+            games += finished
+            table.games += finished
+            if next_checkpoint is not None and games >= next_checkpoint and checkpoint_path is not None:
+                table.save(checkpoint_path)
+                next_checkpoint += checkpoint_every
+    elapsed = time.perf_counter() - start
+    if checkpoint_path is not None:
+        table.save(checkpoint_path)
+    return {"games": games, "elapsed": elapsed, "games_per_second": games / elapsed if elapsed else 0.0}
+
+
+def evaluate(table, num_games=100, opening_moves=1, time_limit=None, seed=0):
+    """
+    Plays a LearnerPlayer using table against ComputerPlayer with no console output. The learner plays 'X' in even
+    games and 'O' in odd games, and every game starts with opening_moves random moves so that the games differ
+
+    :param table: A ValueTable
+    :param num_games: The number of games to play
+    :param opening_moves: The number of random moves each game starts with
+    :param time_limit: The number of seconds ComputerPlayer may spend on each move. Defaults to the limit Game uses
+    :param seed: The seed of the random opening moves
+    :return: A dict with the number of games, and the learner's wins, draws and losses
+    """
+    rng = random.Random(seed)
+    geometry = table.geometry
+    result = {"games": num_games, "wins": 0, "draws": 0, "losses": 0}
+    for i in range(num_games):
+        game = Game("cpu", "cpu", geometry.rows, geometry.cols, geometry.win_length, time_limit)  # Names are given so nothing is asked
+        learner_id = i % 2
+        learner = LearnerPlayer(learner_id, "learner", game.players[learner_id].letter, table)
+        game.players[learner_id] = learner
+        game.cur_player = game.players[0]
+        for _ in range(opening_moves):
+            if game.status != IN_PROGRESS:
+                break
+            game.apply_move(*geometry.cell_coords[rng.choice(game.state.legal_cells())])
+        if game.status == IN_PROGRESS:
+            game.play_game(verbose=False)
+        if game.status != WON:
+            result["draws"] += 1
+        elif game.alternate_player() is learner:  # The player who made the last move won
+            result["wins"] += 1
+        else:
+            result["losses"] += 1
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a table of position values by self-play and evaluate it against ComputerPlayer")
+    parser.add_argument("--games", type=int, default=1000000, help="The number of training games")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="The checkpoint file, which training continues from if it exists")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--win-length", type=int, default=None)
+    parser.add_argument("--checkpoint-every", type=int, default=None, help="The number of games between checkpoints")
+    parser.add_argument("--eval-games", type=int, default=100, help="The number of games against ComputerPlayer")
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds per move for ComputerPlayer")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    value_table = ValueTable.load(args.path) if os.path.exists(args.path) else ValueTable(args.rows, args.cols, args.win_length)
+    training = train(value_table, args.games, seed=args.seed, checkpoint_path=args.path, checkpoint_every=args.checkpoint_every)
+    training["evaluation"] = evaluate(value_table, args.eval_games, time_limit=args.time_limit)
+    print(json.dumps(training, indent=2))
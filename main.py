@@ -29,7 +29,7 @@ def ask_to_play_again():
 if __name__ == "__main__":
     print("Welcome to Tic Tac Toe")
     playing = True
-    game = Game()
+    game = Game(ponder=True)  # The computer searches its replies while a human chooses a move
 
     while playing:
         game.reset()
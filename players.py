@@ -1,3 +1,14 @@
+import math
+import multiprocessing
+import random
+import threading
+import time
+from collections import namedtuple
+
+from bitboard import Board, STANDARD, get_geometry
+from searchstats import SearchStats, BatchStats
+from transposition import SHARED_TABLE, EXACT, LOWER, UPPER, position_key
+
 WINNER = 10
 LOSER = -10
 TIED = 0
@@ -6,6 +17,27 @@ IN_PROGRESS = 1
 MAX = 100
 MIN = -100
 
+DEADLINE_CHECK_INTERVAL = 1024  # The number of nodes an anytime search visits between reads of the clock
+HEURISTIC_LIMIT = WINNER - 1  # Heuristic values stay strictly between LOSER and WINNER so a proven result always outranks them
+
+SEARCH_WIN = 1000000  # The score of a win before any move is played. See ComputerPlayer.search
+FORCED_RESULT = SEARCH_WIN // 2  # Scores at least this far from TIED are forced wins or losses
+INFINITY = SEARCH_WIN + 1  # A score beyond every possible score, for an open search window
+TIE_MARGIN = 1e-6  # Less than the difference between any two different scores
+
+MoveAnalysis = namedtuple("MoveAnalysis", ("row", "col", "value", "distance"))
+MoveAnalysis.__doc__ = """
+The analysis of one move by ComputerPlayer.analyze: the zero-indexed row and column of the move, its minimax value
+(WINNER, TIED or LOSER) for the player making it with best play from both sides, and the number of moves, counting this
+one, until the game ends with that result
+"""
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside minimax when the time budget of an anytime search runs out
+    """
+
 
 class Player:
     """
@@ -22,6 +54,19 @@ class Player:
         self.name = name
         self.letter = letter
 
+    def start_pondering(self, board, move_count):
+        """
+        Called by Game.play_game when the opponent of this player is about to choose a move, so players that can use
+        the opponent's thinking time start working on their reply. Players that cannot do nothing
+        :param board: The current Board, with the opponent to move
+        :param move_count: The number of moves played already
+        """
+
+    def stop_pondering(self):
+        """
+        Stops the work started by start_pondering, if any
+        """
+
 
 class HumanPlayer(Player):
     """
@@ -41,131 +86,1256 @@ class HumanPlayer(Player):
     def get_next_move(board_, move_count):
         """
         Gets the next move for cur_player by asking for the row and column the player would like to move.
-        :param board_: An unused parameter that is only included to allow the Game to call for the next move identically regardless of the player
-        :param move_count: Unused parameter just like board_
+        :param board_: The current board, either as a Board, a GameState or a matrix of characters. Only its dimensions are used, to validate the input
+        :param move_count: An unused parameter that is only included to allow the Game to call for the next move identically regardless of the player
         :return: The row and column of the next move
         """
+        geometry = ComputerPlayer.to_board(board_).geometry
+        num_rows, num_cols = geometry.rows, geometry.cols
+        valid_rows, valid_cols = HumanPlayer.choices(num_rows), HumanPlayer.choices(num_cols)
+        rows_text, cols_text = HumanPlayer.describe_choices(num_rows), HumanPlayer.describe_choices(num_cols)
+
         # Get row and column using command-line input for human player
-        row = input("Enter the row where you want to make your move. Valid rows are 1, 2, and 3: ")  # 1 is the top row, 3 is the bottom row
-        while row not in ("1", "2", "3"):
+        row = input("Enter the row where you want to make your move. Valid rows are " + rows_text + ": ")  # 1 is the top row
+        while row not in valid_rows:
             row = input("Row " + row + " is not an valid row. Enter the row where you want to move. "
-                                       "Valid rows are 1, 2, and 3: ")
-        col = input("Enter the column where you want to make your move. Valid columns are 1, 2, and 3: ")  # 1 is the left column, 3 is the right column
-        while col not in ("1", "2", "3"):
+                                       "Valid rows are " + rows_text + ": ")
+        col = input("Enter the column where you want to make your move. Valid columns are " + cols_text + ": ")  # 1 is the left column
+        while col not in valid_cols:
             col = input("Column " + col + " is not an valid column. Enter the column where you want to move. "
-                                          "Valid columns are 1, 2, and 3: ")
+                                          "Valid columns are " + cols_text + ": ")
         row = int(row) - 1  # Make zero-indexed to access the board matrix
         col = int(col) - 1  # Make zero-indexed to access the board matrix
 
         return row, col
 
+    @staticmethod
+    def choices(count):
+        """
+        :return: The strings "1" to str(count), which are the valid one-indexed inputs for a row or column
+        """
+        return tuple(str(i) for i in range(1, count + 1))
+
+    @staticmethod
+    def describe_choices(count):
+        """
+        :return: A description of the valid one-indexed inputs for a row or column, such as "1, 2, and 3"
+        """
+        if count == 1:
+            return "1"
+        if count == 2:
+            return "1 and 2"
+        return ", ".join(str(i) for i in range(1, count)) + ", and " + str(count)
+
 
 class ComputerPlayer(Player):
     """
     A class that extends the Player class and represents a computer player. It
     gets its moves by using the minimax algorithm. See the README for details
     """
-    def __init__(self, id, name, letter):
+    def __init__(self, id, name, letter, table=SHARED_TABLE, solved_table=None, time_limit=None, collect_stats=False,
+                 stats_callback=None, workers=1, ponder=False):
         """
         :param id: An integer ID of the player, that corresponds to its index in the Game.players array
         :param name: A string representing the name of the player. Always "cpu" for computer players
         :param letter: A character representing the move this player makes. Player 1's letter is 'X' and player 2's letter is 'O'
+        :param table: The TranspositionTable used to remember searched positions. By default every ComputerPlayer in the
+                      process shares one table, so positions are reused across moves and games. None disables the table
+        :param solved_table: An optional SolvedTable (see solved.py). When given, moves are read from the table without
+                             searching, and minimax is only used for positions the table does not contain.
+                             It only applies to standard 3x3 boards
+        :param time_limit: An optional budget in seconds for each move. When given, the move is chosen by an anytime search
+                           that deepens one move at a time until the budget runs out, instead of searching to the end of the game
+        :param collect_stats: If True, every get_next_move records a SearchStats in self.last_stats
+        :param stats_callback: An optional function that is called with the SearchStats of every get_next_move. Giving
+                               one turns on collect_stats
+        :param workers: The number of processes get_next_move searches with. With more than 1, the moves at the root are
+                        split across a pool of worker processes (see parallel_search), which is created on the first move
+                        and kept for later moves and for every other player with the same number of workers
+        :param ponder: If True, start_pondering searches this player's reply to each of the opponent's moves on a
+                       background thread while the opponent chooses, most likely move first. When the opponent's
+                       move has been pondered, get_next_move returns the reply without searching. See Ponderer
         """
         super().__init__(id, name, letter)
         self.is_human = False
+        self.table = table
+        self.solved_table = solved_table
+        self.time_limit = time_limit
+        self.nodes_searched = 0  # The total number of positions visited by minimax over the lifetime of this player
+        self.opponent_letter = self.alternate_letters(letter)
+        self.is_x = letter == "X"
+        self.geometry = STANDARD  # The Geometry of the board being searched
+        self.board = None  # The Board the current search makes and unmakes its moves on
+        self.stop_depth = 0  # The search evaluates positions heuristically instead of recursing once this few cells are unoccupied
+        self.deadline = None  # The time.perf_counter() value at which an anytime search must stop, or None for no limit
+        self.completed_depth = 0  # The number of moves ahead the last anytime search fully searched
+        self.collect_stats = collect_stats or stats_callback is not None
+        self.stats_callback = stats_callback
+        self.stats = None  # The SearchStats of the search in progress, or None when statistics are not being collected
+        self.last_stats = None  # The SearchStats of the most recent search that collected statistics
+        self.root_depth = 0  # The number of unoccupied cells at the position the current search started from
+        self.letters = (letter, self.opponent_letter)  # The letters of the player to move at the root of the current search and of their opponent
+        self.killers = []  # killers[ply] holds the last two moves that caused a cutoff that many moves below the root
+        self.history = {}  # history[letter][cell] grows every time that player's move to cell causes a cutoff
+        self.workers = workers
+        self.ponder = ponder
+        self.ponderer = None  # The Ponderer that searches replies in the background, created by the first start_pondering
+        self.ponder_thread = None  # The thread pondering the opponent's current turn, or None when not pondering
+        self.pondered = {}  # Maps (x_mask, o_mask, geometry) after each pondered opponent's move to the row and column of the reply
+        self.ponder_hits = 0  # The number of moves answered from self.pondered
+        self.ponder_misses = 0  # The number of moves searched because pondering had not reached the opponent's move
 
     def get_next_move(self, board_, move_count):
         """
         Gets the next move for cur_player by using the minimax algorithm.
+        :param board_: The current board, either as a Board, a GameState or a matrix of characters. It is never modified
+        :param move_count: The number of moves played already
         :return: The row and column of the next move
         """
-        board = board_  # Create a copy of the board to pass to minimax so as to not distort the board
-        depth = 9 - move_count  # Integer specifying depth of the board. At start of game the depth = 9 and when game all spaces are occupied the depth = 0
+        if self.collect_stats:
+            return self.get_next_move_with_stats(board_, move_count)[0]
+        return self.choose_move(self.to_board(board_), move_count)
+
+    def get_next_move_with_stats(self, board_, move_count):
+        """
+        Gets the next move like get_next_move, and collects statistics about the search that chose it
+        :return: A tuple of the row and column of the next move, and the SearchStats of the search
+        """
+        board = self.to_board(board_)
+        stats = SearchStats(board.geometry.num_cells - move_count)
+        self.stats = stats
+        start = time.perf_counter()
+        try:
+            move = self.choose_move(board, move_count)
+        finally:
+            self.stats = None
+        stats.elapsed = time.perf_counter() - start
+        self.last_stats = stats
+        if self.stats_callback is not None:
+            self.stats_callback(stats)
+        return move, stats
+
+    def get_next_moves(self, boards):
+        """
+        Gets the next move on each of a batch of boards, searching every position only once. See get_next_moves_with_stats
+        :return: A list with the row and column of the next move on each board
+        """
+        return self.get_next_moves_with_stats(boards)[0]
+
+    def get_next_moves_with_stats(self, boards):
+        """
+        Gets the next move on each of a batch of boards, all with this player to move. Every board is reduced to the
+        canonical form of its position (see Geometry.canonical), so boards in the same position, or in positions that
+        are rotations or reflections of each other, share one search, and the answer is mapped back to each board. The
+        moves are the ones get_next_move would choose for each board, except that an anytime search (with a time_limit)
+        may break ties between equally scored moves differently
+        :param boards: A list of boards that are still in progress, each either a Board, a GameState or a matrix of
+                       characters. The number of moves played on each is its number of occupied cells. They are never modified
+        :return: A tuple of the list with the row and column of the next move on each board, and a BatchStats. As with
+                 get_next_move, the move is (-1, -1) on a board where the game is over
+        """
+        start = time.perf_counter()
+        stats = BatchStats(len(boards))
+        nodes = self.nodes_searched
+        moves = [None] * len(boards)
+        positions = {}  # Maps each canonical (x_mask, o_mask, geometry) to a list of (board index, symmetry index)
+        exact_positions = set()
+        for i, board_ in enumerate(boards):
+            board = self.to_board(board_)
+            geometry = board.geometry
+            if board.is_full() or board.has_won("X") or board.has_won("O"):  # The game is over, so there is no move
+                moves[i] = (-1, -1)
+                continue
+            if self.solved_table is not None and geometry is STANDARD:
+                entry = self.solved_table.lookup(board.x_mask, board.o_mask)
+                if entry is not None:
+                    moves[i] = geometry.cell_coords[entry[0]]
+                    stats.table_answers += 1
+                    continue
+            exact_positions.add((board.x_mask, board.o_mask, geometry))
+            x_mask, o_mask, symmetry = geometry.canonical(board.x_mask, board.o_mask)
+            positions.setdefault((x_mask, o_mask, geometry), []).append((i, symmetry))
+        stats.exact_positions = len(exact_positions)
+        stats.distinct_positions = len(positions)
+
+        for (x_mask, o_mask, geometry), requests in positions.items():
+            board = Board(x_mask, o_mask, geometry)
+            move_count = bin(x_mask | o_mask).count("1")
+            if self.time_limit is not None:
+                cell = geometry.cell_index(*self.choose_move(board, move_count))
+                for i, symmetry in requests:
+                    moves[i] = geometry.cell_coords[geometry.inverse_symmetries[symmetry][cell]]
+                continue
+            scores = self.root_move_scores(board, geometry.num_cells - move_count)
+            for i, symmetry in requests:
+                # Choose with the rule of search_root in the board's own coordinates, so ties go to the same move
+                inverse = geometry.inverse_symmetries[symmetry]
+                best_cell, best_score = -1, -INFINITY
+                for cell, score in scores:
+                    if self.better_root_move(inverse[cell], score, best_cell, best_score):
+                        best_cell, best_score = inverse[cell], score
+                moves[i] = geometry.cell_coords[best_cell]
+
+        stats.nodes = self.nodes_searched - nodes
+        stats.elapsed = time.perf_counter() - start
+        return moves, stats
+
+    def root_move_scores(self, board, depth):
+        """
+        Scores every move on a board that is still in progress, with this player to move. Forced results are only told
+        apart from each other as wins or losses, so a win scores at least FORCED_RESULT and a loss at most -FORCED_RESULT
+        :param board: A Board
+        :param depth: The number of unoccupied cells
+        :return: A list of (cell, score) tuples for every unoccupied cell. See search()
+        """
+        self.start_search(board, depth, self.letter)
+        self.board = board.copy()
+        self.nodes_searched += 1
+        scores = {}
+        symmetries = board.geometry.kept_symmetries(board.x_mask, board.o_mask)
+        occupied = board.x_mask | board.o_mask
+        for cell in range(board.geometry.num_cells):
+            if occupied & board.geometry.cell_bits[cell] or cell in scores:
+                continue
+            won = self.board.make_move(cell, self.letter)
+            score = -self.search(depth - 1, -FORCED_RESULT, FORCED_RESULT, won, self.opponent_letter)
+            self.board.unmake_move(cell, self.letter)
+            scores[cell] = score
+            for symmetry in symmetries:  # Moves the position's symmetries map onto each other have the same score
+                scores[symmetry[cell]] = score
+        return sorted(scores.items())
+
+    def analyze(self, board_, move_count, top_k=None):
+        """
+        Scores every legal move in one search, for a hint or analysis feature. The moves share the transposition
+        table, killer moves and history of the search, and moves that a symmetry of the position maps onto each other
+        are searched once. Every move is searched to the end of the game, so the values are exact however the player
+        was configured, but positions too large for a full minimax search will not finish
+
+        :param board_: The current board, either as a Board, a GameState or a matrix of characters. It is never modified
+        :param move_count: The number of moves played already
+        :param top_k: If given, only the top_k best moves are returned. A move is then only searched far enough to prove
+                      it is worse than the top_k best moves found before it, which is cheaper than scoring it exactly
+        :return: A list of MoveAnalysis, from the best move to the worst. Faster wins and slower losses rank higher,
+                 and moves with the same result in the same number of moves are in row-major order. The list is empty
+                 if the game is over
+        :raises ValueError: If top_k is less than 1
+        """
+        if top_k is not None and top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        board = self.to_board(board_)
+        geometry = board.geometry
+        depth = geometry.num_cells - move_count
+        self.start_search(board, depth, self.letter)
+        self.board = board.copy()
+        self.nodes_searched += 1
+        if board.has_won("X") or board.has_won("O") or depth == 0:
+            return []
+
+        moves, winning = self.order_moves(self.board, self.letter, 0, -1, False)
+        if winning:  # order_moves only lists the win, so the other moves follow it in the usual order
+            moves += [cell for cell in geometry.cell_order if cell != moves[0] and not board.occupied() & geometry.cell_bits[cell]]
+        symmetries = geometry.kept_symmetries(board.x_mask, board.o_mask)
+        scores = {}
+        for cell in moves:
+            if cell in scores:
+                continue
+            floor = -INFINITY
+            if top_k is not None and len(scores) >= top_k:
+                floor = sorted(scores.values(), reverse=True)[top_k - 1] - TIE_MARGIN  # Moves that tie the k-th best move are kept
+            won = self.board.make_move(cell, self.letter)
+            score = -self.search(depth - 1, -INFINITY, -floor, won, self.opponent_letter)
+            self.board.unmake_move(cell, self.letter)
+            if score <= floor:  # The move is worse than the top_k moves found so far, and its score is only a bound
+                continue
+            scores[cell] = score
+            for symmetry in symmetries:  # Moves the position's symmetries map onto each other have the same score
+                scores[symmetry[cell]] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if top_k is not None:
+            ranked = ranked[:top_k]
+        analysis = []
+        for cell, score in ranked:
+            value = self.to_value(score)
+            distance = SEARCH_WIN - abs(score) if value != TIED else depth  # A drawn game ends when the board is full
+            analysis.append(MoveAnalysis(*geometry.cell_coords[cell], value, distance))
+        return analysis
+
+    def choose_move(self, board, move_count):
+        """
+        Chooses the next move on a Board. See get_next_move
+        """
+        geometry = board.geometry
+        if self.ponder_thread is not None:
+            move = self.take_pondered_move(board)
+            if move is not None:
+                return move
+
+        if self.solved_table is not None and geometry is STANDARD:
+            entry = self.solved_table.lookup(board.x_mask, board.o_mask)
+            if entry is not None:
+                return geometry.cell_coords[entry[0]]
+
+        depth = geometry.num_cells - move_count  # Integer specifying depth of the board. At start of a 3x3 game the depth = 9 and when game all spaces are occupied the depth = 0
+        if self.time_limit is not None:
+            cell = self.iterative_deepening(board, depth)
+            return (-1, -1) if cell < 0 else geometry.cell_coords[cell]  # -1 means the game is over, as with minimax
+        if self.workers > 1:
+            self.start_search(board, depth, self.letter)
+            cell = self.parallel_search(board, depth)[0]
+            return (-1, -1) if cell < 0 else geometry.cell_coords[cell]
+
         maximizing = True  # Minimax begins with a maximization step
-        best_move = self.minimax(board=board, depth=depth, maximizing=maximizing, letter=self.letter, alpha=-100, beta=100)
+        best_move = self.minimax(board=board, depth=depth, maximizing=maximizing, letter=self.letter, alpha=MIN, beta=MAX)
         row, col = best_move[0], best_move[1]
 
         return row, col
 
+    def start_pondering(self, board, move_count):
+        """
+        Starts searching the reply to each of the opponent's moves on board in the background, if pondering is on.
+        See Ponderer.search_replies
+        """
+        if not self.ponder:
+            return
+        self.stop_pondering()
+        if self.ponderer is None:
+            self.ponderer = Ponderer(self)
+        self.ponderer.cancelled = False
+        self.pondered = {}
+        self.ponder_thread = threading.Thread(target=self.ponderer.search_replies, args=(board.copy(), move_count, self.pondered),
+                                              daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        """
+        Cancels the search of the background thread and waits for it to stop, which happens within one node of the search
+        """
+        if self.ponder_thread is None:
+            return
+        self.ponderer.cancelled = True
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
+    def take_pondered_move(self, board):
+        """
+        Stops pondering and looks up the reply it chose for board
+        :return: The row and column of the reply, or None if pondering had not reached board
+        """
+        self.stop_pondering()
+        move = self.pondered.get((board.x_mask, board.o_mask, board.geometry))
+        self.pondered = {}
+        if move is None:
+            self.ponder_misses += 1
+        else:
+            self.ponder_hits += 1
+        return move
+
     def minimax(self, board, depth, maximizing, letter, alpha, beta):
         """
         An implementation of the minimax algorithm with alpha-beta pruning which determines the best move, assuming the opponent plays optimally
         This algorithm associates board states with quantitative values and tries to maximize the minimum value board state the opponent can achieve
-        See the README for more details
+        The search itself is a negamax (see search()), which scores every position for the player to move. See the README for more details
 
-        :param board: A 3x3 array of chars representing the board configuration at the current level of recursion
-        :param depth: An integer specifying the depth of the board at the current level of recursion. Depth begins at 9 at the start of the game
-                      and decreases to 0 when all spaces are occupied
-        :param letter: The letter of the current player. Either X or O. Used to update the board once the player chooses a move
+        :param board: A Board or a matrix of chars representing the board configuration at the current level of recursion
+        :param depth: An integer specifying the depth of the board at the current level of recursion. Depth begins at the number of cells
+                      at the start of the game and decreases to 0 when all spaces are occupied
+        :param letter: The letter of the current player. Either X or O. The search places this player's letter on maximizing steps
+                       and the opponent's letter on minimizing steps, so letter must match maximizing
         :param maximizing: A boolean representing if this step is maximizing or minimizing
         :param alpha: The best value that the maximizer currently can guarantee at the current level or above.
         :param beta: The best value that the minimizer currently can guarantee at the current level or above.
         :return: Array containing the row and col of the best move, and the value of the best move
         """
+        board = self.to_board(board)
+        to_move = self.letter if maximizing else self.opponent_letter
+        self.start_search(board, depth, to_move)
+        self.board = board.copy()  # The search makes and unmakes moves on its own copy, so the caller's board is never modified
+        if not maximizing:  # Convert the window to the perspective of the opponent, who is to move
+            alpha, beta = -beta, -alpha
+        cell, score = self.search_root(depth, self.to_score(alpha), self.to_score(beta))
+        value = self.to_value(score)
+        if not maximizing:
+            value = -value
+        if cell < 0:
+            return [-1, -1, value]
+        row, col = self.geometry.cell_coords[cell]
+        return [row, col, value]
+
+    def iterative_deepening(self, board, depth):
+        """
+        An anytime version of minimax. It searches 1 move ahead, then 2 moves ahead, and so on, scoring the positions at the
+        search horizon with heuristic(), until the game is searched to the end, a forced result is found, or self.time_limit
+        runs out. The first iteration always completes, so a move is always returned
 
-        board_value = self.evaluate_board(board, depth)  # Determine if the game is in progress, has a winner, or is a draw
-        if board_value in (WINNER, LOSER, TIED):  # if game_over=10 then they won, if game_over=-10, then they lost
-            return [-1, -1, board_value]
+        :param board: A Board representing the current board configuration
+        :param depth: The number of unoccupied cells
+        :return: The cell index of the best move found by the deepest completed iteration
+        """
+        self.start_search(board, depth, self.letter)  # Killer moves and history are kept from one iteration to the next
+        deadline = time.perf_counter() + self.time_limit
+        best_cell = -1
+        self.completed_depth = 0
+        try:
+            for horizon in range(1, depth + 1):
+                self.stop_depth = depth - horizon
+                self.deadline = deadline if best_cell >= 0 else None
+                if self.workers > 1:
+                    best_cell, score = self.parallel_search(board, depth)
+                else:
+                    self.board = board.copy()  # A timed out iteration leaves its moves on the board, so every iteration starts from a fresh copy
+                    best_cell, score = self.search_root(depth, -INFINITY, INFINITY)
+                self.completed_depth = horizon
+                if abs(score) >= FORCED_RESULT or time.perf_counter() >= deadline:  # A forced result cannot change with a deeper search
+                    break
+        except SearchTimeout:
+            pass  # Keep the move of the deepest completed iteration
+        finally:
+            self.stop_depth = 0
+            self.deadline = None
+        return best_cell
 
-        # If there was no winner and no draw, then continue to recurse
-        if maximizing:
-            best_move = [-1, -1, MIN]  # Initialize the best move at this step as row=-1, col=-1, and value=-100. Every possible move will have a value > -100, so best_move will always be overwritten by a valid move
-        else:
-            best_move = [-1, -1, MAX]
-
-        valid_moves = [(i, j) for i in range(3) for j in range(3) if board[i][j] == '-']
-        for move in valid_moves:  # Iterate through all (row, col) pairs of remaining moves
-            r, c = move[0], move[1]
-            board[r][c] = letter  # Update the board with the current player's letter at the current row, col.
-            cur_move = self.minimax(board, depth - 1, not maximizing, self.alternate_letters(letter), alpha, beta)  # Determine the value of this move by calling minimax with the updated board
-            board[r][c] = "-"  # Undo the move done in this level of the for-loop
-            cur_move[0], cur_move[1] = r, c  # Update cur_move to contain the move at this level of recursion rather than lower levels
-            if maximizing:
-                alpha = max(alpha, best_move[2])
-                if cur_move[2] > best_move[2]:  # Update best_move if this move has a higher value than the current best_move
-                    best_move = cur_move
+    def start_search(self, board, depth, to_move):
+        """
+        Prepares the state shared by every node of a search from board
+        :param to_move: The letter of the player to move at the root
+        """
+        self.geometry = board.geometry
+        self.root_depth = depth
+        self.letters = (to_move, self.alternate_letters(to_move))
+        self.killers = [[-1, -1] for _ in range(depth + 1)]
+        self.history = {"X": [0] * self.geometry.num_cells, "O": [0] * self.geometry.num_cells}
+
+    def search_root(self, depth, alpha, beta):
+        """
+        The first step of the search. Moves are compared by their minimax value, so every win counts the same however
+        fast it is, and ties go to the first move in row-major order. This chooses the same moves as a plain minimax
+        that tries the cells in row-major order. Transposition table entries of other positions are not used to choose
+        the move, since their moves may have been chosen among ties in a different order
+
+        :param depth: The number of unoccupied cells
+        :param alpha: The score below which this player is not interested in exact scores
+        :param beta: The score above which this player is not interested in exact scores
+        :return: Tuple of the cell index of the best move (-1 at a terminal board) and its score. See search()
+        """
+        self.nodes_searched += 1
+        stats = self.stats
+        if stats is not None:
+            stats.nodes_per_depth[0] += 1
+        board = self.board
+        geometry = self.geometry
+        letter = self.letters[0]
+        board_value = self.evaluate_masks(board.mask_for(letter), board.mask_for(self.letters[1]), depth, geometry)
+        if board_value != IN_PROGRESS or depth <= self.stop_depth:
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            if board_value == IN_PROGRESS:
+                return -1, self.heuristic(board, letter)
+            return -1, SEARCH_WIN if board_value == WINNER else -SEARCH_WIN if board_value == LOSER else board_value
+        searched_depth = depth - self.stop_depth
+
+        # Root results are stored under the complement of the position's key, so they are only ever read back by another
+        # root search, which needs its ties broken as described above
+        table = self.table
+        hash_cell = -1
+        full_window = alpha <= -INFINITY and beta >= INFINITY
+        if table is not None:
+            key = ~self.position_key(board, letter)
+            entry = table.lookup(key)
+            if entry is not None:
+                if full_window and entry[0] >= searched_depth:
+                    if stats is not None:
+                        stats.table_hits += 1
+                    return entry[2], entry[1]
+                hash_cell = entry[2]
+
+        moves, winning = self.order_moves(board, letter, 0, hash_cell, False)
+        if stats is not None:
+            stats.expanded_nodes += 1
+        best_cell = -1
+        best_score = -INFINITY
+        if winning:  # A win with this move is the best result, so only the moves before it in row-major order can tie it
+            best_cell, best_score = moves[0], SEARCH_WIN - 1
+            moves = [cell for cell in range(best_cell) if not (board.x_mask | board.o_mask) & geometry.cell_bits[cell]]
+        moves = self.distinct_moves(board, moves, True)
+
+        opponent_letter = self.letters[1]
+        for cell in moves:
+            floor = self.root_floor(cell, best_cell, best_score)
+            if floor is None:
+                continue
+            won = board.make_move(cell, letter)
+            score = -self.search(depth - 1, -beta, -max(alpha, floor), won, opponent_letter)
+            board.unmake_move(cell, letter)
+            if self.better_root_move(cell, score, best_cell, best_score):
+                best_cell, best_score = cell, score
+                if score >= beta:
+                    if stats is not None:
+                        stats.cutoffs_per_depth[0] += 1
+                    break
+
+        if table is not None and full_window:
+            table.store(key, searched_depth, best_score, best_cell, EXACT)
+        return best_cell, best_score
+
+    def parallel_search(self, board, depth):
+        """
+        A version of search_root that searches the moves at the root in parallel. Each move is searched by a process of
+        the pool for self.workers with search_root_move(). The processes share the best move found so far and its
+        score, so a move searched after it only needs to find out whether it does better, which lets its subtree be
+        cut off sooner. The results are combined with the same rule as search_root, so the same move is chosen
+
+        :param board: A Board representing the current board configuration. start_search must have been called with it
+        :param depth: The number of unoccupied cells
+        :return: Tuple of the cell index of the best move and its score. The cell is -1 if the game is over
+        :raises SearchTimeout: If self.deadline passed before every move was searched
+        """
+        self.board = board.copy()
+        letter = self.letters[0]
+        if board.has_won("X") or board.has_won("O") or depth <= 1:  # Nothing to split
+            return self.search_root(depth, -INFINITY, INFINITY)
+        self.nodes_searched += 1
+        stats = self.stats
+        if stats is not None:
+            stats.nodes_per_depth[0] += 1
+            stats.expanded_nodes += 1
+        moves, winning = self.order_moves(board, letter, 0, -1, False)
+        best_cell = -1
+        best_score = -INFINITY
+        if winning:  # As in search_root, only the moves before a win in row-major order can tie it
+            best_cell, best_score = moves[0], SEARCH_WIN - 1
+            moves = [cell for cell in range(best_cell) if not (board.x_mask | board.o_mask) & self.geometry.cell_bits[cell]]
+            if not moves:
+                return best_cell, best_score
+        moves = self.distinct_moves(board, moves, True)
+
+        pool, bound = get_search_pool(self.workers)
+        with bound.get_lock():
+            bound[0], bound[1] = best_score, best_cell
+        geometry = self.geometry
+        # The deadline is sent as a time.time() value, which unlike time.perf_counter() is the same in every process
+        deadline = None if self.deadline is None else time.time() + self.deadline - time.perf_counter()
+        tasks = [(board.x_mask, board.o_mask, geometry.rows, geometry.cols, geometry.win_length, letter, cell,
+                  self.stop_depth, deadline, stats is not None) for cell in moves]
+        timed_out = False
+        for cell, score, nodes, move_stats, move_timed_out in pool.imap_unordered(search_root_move, tasks):
+            self.nodes_searched += nodes
+            if move_stats is not None:
+                stats.merge(move_stats)
+            timed_out = timed_out or move_timed_out
+            if score is None:  # The move timed out, or could not replace the best move when it was searched
+                continue
+            if self.better_root_move(cell, score, best_cell, best_score):
+                best_cell, best_score = cell, score
+        if timed_out:
+            raise SearchTimeout()
+        return best_cell, best_score
+
+    @classmethod
+    def root_floor(cls, cell, best_cell, best_score):
+        """
+        Only a better result than the best move so far can replace it, unless the move comes before it in row-major
+        order, where the same result is enough. This gives the score below which a move at the root cannot replace the
+        best move, so it is searched with a window that tells those cases apart
+        :return: The lower end of the window to search cell with, or None if cell cannot replace the best move
+        """
+        if best_cell < 0:
+            return -INFINITY
+        best_value = cls.to_value(best_score)
+        if cell > best_cell:
+            if best_value == WINNER:
+                return None
+            return -FORCED_RESULT if best_value == LOSER else best_score
+        if best_value == WINNER:
+            return FORCED_RESULT - 1
+        if best_value == LOSER:
+            return -INFINITY
+        return best_score - TIE_MARGIN
+
+    @classmethod
+    def better_root_move(cls, cell, score, best_cell, best_score):
+        """
+        :return: True if moving to cell, with the given score, replaces the best move so far at the root. See search_root()
+        """
+        if best_cell < 0:
+            return True
+        value, best_value = cls.to_value(score), cls.to_value(best_score)
+        return value > best_value or (value == best_value and cell < best_cell)
+
+    def search(self, depth, alpha, beta, last_move_won, letter):
+        """
+        The recursive step of the search, a negamax with alpha-beta pruning. Every position is scored for the player to
+        move, so a move's score is the negation of the score of the position it leads to. Moves are played on self.board
+        with make_move() and taken back with unmake_move(), and a win is detected from the line counts of the move that
+        was just played instead of rescanning the board
+
+        Forced results are scored by how soon they happen: a win on the p-th move from the root scores SEARCH_WIN - p, and
+        a loss the negation, so the search prefers faster wins and slower losses. Draws score TIED and positions at the
+        horizon of an anytime search score their heuristic()
+
+        :param depth: The number of unoccupied cells. Positions with self.stop_depth unoccupied cells are scored by heuristic()
+        :param alpha: The score the player to move can already guarantee elsewhere. Lower scores are not told apart
+        :param beta: The score the opponent can already hold the player to move to elsewhere. Higher scores are not told apart
+        :param last_move_won: True if the move that led to this position completed a win line
+        :param letter: The letter of the player to move
+        :return: The score of the position for the player to move. When it is at most alpha or at least beta it is only a
+                 bound on the exact score
+        """
+        self.nodes_searched += 1
+        if self.deadline is not None and not self.nodes_searched % DEADLINE_CHECK_INTERVAL and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        ply = self.root_depth - depth  # The number of moves played since the root
+        stats = self.stats
+        if stats is not None:
+            stats.nodes_per_depth[ply] += 1
+        board = self.board
+        if last_move_won or depth == 0 or depth <= self.stop_depth:
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            if last_move_won:
+                return ply - SEARCH_WIN  # The player who just moved won
+            if depth == 0:
+                return TIED
+            return self.heuristic(board, letter)  # The search horizon of an anytime search has been reached
+
+        # The player to move cannot do better than winning with this move, or worse than losing to the opponent's next
+        # move, so a window outside those scores is narrowed to them
+        best_possible = SEARCH_WIN - ply - 1
+        if beta > best_possible:
+            beta = best_possible
+        if alpha < -best_possible + 1:
+            alpha = -best_possible + 1
+        if alpha >= beta:
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return alpha
+        searched_depth = depth - self.stop_depth  # The number of moves searched below this position, which is what table entries record
+
+        # Entries are stored from the perspective of the player to move. Forced results are stored as the number of
+        # moves from this position rather than from the root, so they stay correct when the position is reached at a
+        # different ply
+        table = self.table
+        hash_cell = -1
+        if table is not None:
+            key = self.position_key(board, letter)
+            entry = table.lookup(key)
+            if entry is not None:
+                if entry[3] != UPPER:  # Every move of an upper bound failed low, so its cell is no better than the others
+                    hash_cell = entry[2]
+                if entry[0] >= searched_depth:
+                    _, value, _, bound = entry
+                    if value >= FORCED_RESULT:
+                        value -= ply
+                    elif value <= -FORCED_RESULT:
+                        value += ply
+                    if bound == EXACT:
+                        if stats is not None:
+                            stats.table_hits += 1
+                        return value
+                    if bound == LOWER and value > alpha:
+                        alpha = value
+                    elif bound == UPPER and value < beta:
+                        beta = value
+                    if alpha >= beta:
+                        if stats is not None:
+                            stats.table_hits += 1
+                        return value
+        alpha_orig = alpha
+
+        moves, winning = self.order_moves(board, letter, ply, hash_cell, True)
+        if winning:  # Nothing beats winning with this move, so no other move is searched
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return best_possible
+        if len(moves) > 1:
+            moves = self.distinct_moves(board, moves, False)
+        if stats is not None:
+            stats.expanded_nodes += 1
+
+        best_cell = -1
+        best_score = -INFINITY
+        opponent_letter = self.letters[1] if letter == self.letters[0] else self.letters[0]
+        for cell in moves:
+            won = board.make_move(cell, letter)
+            score = -self.search(depth - 1, -beta, -alpha, won, opponent_letter)
+            board.unmake_move(cell, letter)
+            if score > best_score:
+                best_cell, best_score = cell, score
+                if score > alpha:
+                    alpha = score  # Narrow the window as soon as a better move is found
+                    if alpha >= beta:  # The opponent will avoid this position, so the remaining moves cannot matter
+                        if stats is not None:
+                            stats.cutoffs_per_depth[ply] += 1
+                        killers = self.killers[ply]
+                        if killers[0] != cell:
+                            killers[1] = killers[0]
+                            killers[0] = cell
+                        self.history[letter][cell] += searched_depth * searched_depth
+                        break
+
+        if table is not None:
+            if best_score <= alpha_orig:
+                bound = UPPER
+            elif best_score >= beta:
+                bound = LOWER
             else:
-                beta = min(beta, best_move[2])
-                if cur_move[2] < best_move[2]:
-                    best_move = cur_move
+                bound = EXACT
+            value = best_score
+            if value >= FORCED_RESULT:
+                value += ply
+            elif value <= -FORCED_RESULT:
+                value -= ply
+            table.store(key, searched_depth, value, best_cell, bound)
+        return best_score
 
-            if beta <= alpha:  # Stop searching the current move if a possibility has been found that proves this move worse than a previously found move.
-                break
+    def order_moves(self, board, letter, ply, hash_cell, forced_only):
+        """
+        Lists the moves of the player to move in the order the search tries them: moves that block a line the opponent
+        would complete next, the move the transposition table remembers as best, then the cells with the most win
+        lines through them, which on a 3x3 board are the center and then the corners, and among those the killer moves
+        of this ply and the moves with the best history
 
-        return best_move
+        :param board: The Board to move on
+        :param letter: The letter of the player to move
+        :param ply: The number of moves played since the root
+        :param hash_cell: The cell remembered by the transposition table, or -1
+        :param forced_only: If True and the opponent threatens to complete a line, only the blocking moves are listed,
+                            since every other move loses on the opponent's next move
+        :return: A tuple of the list of cells, and True if the player can win with this move, in which case the list only
+                 holds the first winning cell in row-major order
+        """
+        geometry = self.geometry
+        if letter == "X":
+            own_counts, opp_counts = board.x_counts, board.o_counts
+        else:
+            own_counts, opp_counts = board.o_counts, board.x_counts
+        needed = geometry.win_length - 1
+        wins = blocks = 0
+        for own, opp, win_mask in zip(own_counts, opp_counts, geometry.win_masks):
+            if own == needed and not opp:
+                wins |= win_mask
+            elif opp == needed and not own:
+                blocks |= win_mask
+        occupied = board.x_mask | board.o_mask
+        if wins:
+            wins &= ~occupied
+            return [(wins & -wins).bit_length() - 1], True
+
+        cell_bits = geometry.cell_bits
+        blocks &= ~occupied
+        if blocks and forced_only:
+            cells = [cell for cell in geometry.cell_order if blocks & cell_bits[cell]]
+            if len(cells) == 1:
+                return cells, False
+        else:
+            cells = [cell for cell in geometry.cell_order if not occupied & cell_bits[cell]]
+        weights = geometry.cell_weights
+        killers = self.killers[ply]
+        history = self.history[letter]
+        cells.sort(key=lambda cell: (blocks & cell_bits[cell] != 0, cell == hash_cell, weights[cell], cell in killers,
+                                     history[cell]), reverse=True)  # The sort is stable, so ties stay in cell_order
+        return cells, False
+
+    def distinct_moves(self, board, moves, lowest):
+        """
+        Removes the moves that a symmetry of the position maps onto another move. The positions they lead to are
+        rotations or reflections of each other, so they have the same value and only one of them needs to be searched.
+        On the empty 3x3 board this leaves the center, a corner and an edge
+
+        :param board: The Board to move on
+        :param moves: The cells to move to, in the order they are searched
+        :param lowest: If True, each move is replaced by the lowest cell it is equivalent to, which is the one search_root
+                       would choose among them. Otherwise the first of the equivalent moves in moves is kept
+        :return: A list of the moves that are not equivalent to each other, in the order of moves
+        """
+        symmetries = self.geometry.kept_symmetries(board.x_mask, board.o_mask)
+        if not symmetries:
+            return moves
+        distinct = []
+        covered = 0  # The cells equivalent to a move already kept
+        for cell in moves:
+            if covered >> cell & 1:
+                continue
+            equivalent = [symmetry[cell] for symmetry in symmetries]
+            distinct.append(min(cell, *equivalent) if lowest else cell)
+            for other in equivalent:
+                covered |= 1 << other
+        if self.stats is not None:
+            self.stats.symmetric_moves += len(moves) - len(distinct)
+        return distinct
+
+    def position_key(self, board, letter):
+        """
+        :return: The transposition table key of board with letter to move
+        """
+        if letter == "X":
+            return position_key(board.x_mask, board.o_mask, self.geometry)
+        return position_key(board.o_mask, board.x_mask, self.geometry)
+
+    @staticmethod
+    def to_score(value):
+        """
+        Converts a minimax value into a search score. See search()
+        """
+        if value > WINNER:
+            return INFINITY
+        if value < LOSER:
+            return -INFINITY
+        if value == WINNER:
+            return FORCED_RESULT
+        if value == LOSER:
+            return -FORCED_RESULT
+        return value
+
+    @staticmethod
+    def to_value(score):
+        """
+        Converts a search score into a minimax value, which is WINNER or LOSER for every forced result. See search()
+        """
+        if score >= FORCED_RESULT:
+            return WINNER
+        if score <= -FORCED_RESULT:
+            return LOSER
+        return score
 
     def evaluate_board(self, board, depth):
         """
         Evaluates the current state of the board and returns the board's value
         Only called from minimax, and is different from check_status, which checks only if the game is still playing, won, or a draw.
-        :param board: A 3x3 matrix representing the board to be evaluated
-        :param depth: The current depth of recursion. Depth=9 when the board is empty and 0 when it is full
-        :return: 10 if the game was won by the cpu who called minimax, -10 if lost, -1 otherwise
-        """
-        win_states = [
-            [board[0][0], board[0][1], board[0][2]],
-            [board[1][0], board[1][1], board[1][2]],
-            [board[2][0], board[2][1], board[2][2]],
-            [board[0][0], board[1][0], board[2][0]],
-            [board[0][1], board[1][1], board[2][1]],
-            [board[0][2], board[1][2], board[2][2]],
-            [board[0][0], board[1][1], board[2][2]],
-            [board[2][0], board[1][1], board[0][2]],
-        ]  # These represent all combinations of 3 cells that are required to be the same letter for the game to be won
-        win_letter = self.letter  # If a win state is composed of initial_player's letter then they won
-        lose_letter = self.alternate_letters(self.letter)  # If a win state is composed of the opponent's letter then they lost
-        if [win_letter, win_letter, win_letter] in win_states:  # Check if one of the win_states has all 3 values as the win_letter
+        :param board: A Board or a matrix representing the board to be evaluated
+        :param depth: The current depth of recursion. Depth is the number of cells when the board is empty and 0 when it is full
+        :return: 10 if the game was won by the cpu who called minimax, -10 if lost, 0 if tied, 1 otherwise
+        """
+        board = self.to_board(board)
+        return self.evaluate_masks(board.mask_for(self.letter), board.mask_for(self.alternate_letters(self.letter)), depth,
+                                   board.geometry)
+
+    @staticmethod
+    def evaluate_masks(own, opp, depth, geometry=STANDARD):
+        """
+        Evaluates a board given as the masks of both players. See evaluate_board
+        """
+        if geometry.has_line(own):  # Check if one of the win lines is fully occupied by this player
             return WINNER
-        elif [lose_letter, lose_letter, lose_letter] in win_states:  # Check if one of the win_states has all 3 values as the lose_letter
+        elif geometry.has_line(opp):  # Check if one of the win lines is fully occupied by the opponent
             return LOSER
         elif depth == 0:
             return TIED
         else:
             return IN_PROGRESS
 
+    def heuristic(self, board, letter=None):
+        """
+        Estimates the value of a position that is still in progress, for the positions at the horizon of an anytime search
+        Every win line that only one player occupies counts for that player, and lines closer to being complete count
+        for exponentially more. The number of letters of each player in each line is read from the board's line counts
+        :param board: The Board to evaluate
+        :param letter: The letter of the player to evaluate the position for. Defaults to this player's letter
+        :return: A value strictly between LOSER and WINNER, where higher values are better for that player
+        """
+        if letter is None:
+            letter = self.letter
+        score = 0
+        for own_count, opp_count in zip(board.counts_for(letter), board.counts_for(self.alternate_letters(letter))):
+            if not opp_count:
+                score += (1 << (2 * own_count)) - 1
+            elif not own_count:
+                score -= (1 << (2 * opp_count)) - 1
+        value = score * 4 / (1 << (2 * self.geometry.win_length - 2))  # One line that needs a single letter to win scores about 4
+        return max(-HEURISTIC_LIMIT, min(HEURISTIC_LIMIT, value))
+
+    @staticmethod
+    def to_board(board):
+        """
+        :param board: A Board, a GameState (see tictactoe.py) or a matrix of characters
+        :return: board as a Board. A GameState is converted with its to_board() method, which gives a new Board
+        """
+        if isinstance(board, Board):
+            return board
+        if hasattr(board, "to_board"):  # A GameState, which cannot be imported here since tictactoe.py imports this module
+            return board.to_board()
+        return Board.from_rows(board)
+
     @staticmethod
     def alternate_letters(letter):
         if letter == "X":
             return "O"
         else:
             return "X"
+
+
+search_pools = {}  # Maps a number of workers to the process pool and shared bound of parallel searches with that many workers
+
+
+def get_search_pool(workers):
+    """
+    Returns the pool used by parallel searches with the given number of workers, creating it the first time it is
+    requested. The pool is kept until close_search_pools(), so later moves do not pay for starting processes
+    :return: A tuple of the multiprocessing.Pool and the shared array holding the best score and cell found so far
+    """
+    if workers not in search_pools:
+        bound = multiprocessing.Array("d", 2)
+        search_pools[workers] = (multiprocessing.Pool(workers, init_search_worker, (bound,)), bound)
+    return search_pools[workers]
+
+
+def close_search_pools():
+    """
+    Stops the processes of every parallel search pool
+    """
+    for pool, _ in search_pools.values():
+        pool.terminate()
+        pool.join()
+    search_pools.clear()
+
+
+worker_bound = None  # The shared best score and cell of the pool this worker process belongs to, set by init_search_worker
+worker_players = {}  # Maps a letter to the ComputerPlayer a worker process searches with, so its transposition table stays warm
+
+
+def init_search_worker(bound):
+    global worker_bound
+    worker_bound = bound
+
+
+def search_root_move(task):
+    """
+    Searches one move at the root of a parallel search. Runs in a worker process, so it only takes and returns plain values
+    :param task: A tuple of the x and o masks, rows, cols and win length of the board, the letter to move, the cell of
+                 the move, the stop_depth, the time.time() at which to stop or None, and whether to collect statistics
+    :return: A tuple of the cell, its score or None if it was not searched to the end, the number of nodes searched,
+             the SearchStats or None, and whether the search timed out
+    """
+    x_mask, o_mask, rows, cols, win_length, letter, cell, stop_depth, deadline, collect_stats = task
+    if letter not in worker_players:
+        worker_players[letter] = ComputerPlayer(0 if letter == "X" else 1, "cpu", letter)
+    player = worker_players[letter]
+    board = Board(x_mask, o_mask, get_geometry(rows, cols, win_length))
+    depth = board.geometry.num_cells - bin(x_mask | o_mask).count("1")
+    player.start_search(board, depth, letter)
+    player.board = board
+    player.stop_depth = stop_depth
+    player.deadline = None if deadline is None else time.perf_counter() + deadline - time.time()
+    player.stats = SearchStats(depth) if collect_stats else None
+    nodes = player.nodes_searched
+    with worker_bound.get_lock():
+        best_score, best_cell = worker_bound[0], int(worker_bound[1])
+    floor = player.root_floor(cell, best_cell, best_score)
+    score = None
+    timed_out = False
+    try:
+        if floor is not None:
+            won = board.make_move(cell, letter)
+            score = -player.search(depth - 1, -INFINITY, -floor, won, player.letters[1])
+            with worker_bound.get_lock():  # Share the move if it is the best so far, so later moves are searched against it
+                if player.better_root_move(cell, score, int(worker_bound[1]), worker_bound[0]):
+                    worker_bound[0], worker_bound[1] = score, cell
+    except SearchTimeout:
+        timed_out = True
+    finally:
+        stats = player.stats
+        player.stop_depth = 0
+        player.deadline = None
+        player.stats = None
+    return cell, score, player.nodes_searched - nodes, stats, timed_out
+
+
+class Ponderer(ComputerPlayer):
+    """
+    A class that extends ComputerPlayer to search a ComputerPlayer's replies on a background thread while the
+    opponent chooses a move. It has the same settings and transposition table as the player, so it chooses the same
+    replies, but searches with its own board, killer moves and history. Setting cancelled makes the search in progress
+    raise SearchTimeout at its next node
+    """
+    def __init__(self, player):
+        """
+        :param player: The ComputerPlayer to ponder for
+        """
+        super().__init__(player.id, player.name, player.letter, table=player.table, solved_table=player.solved_table,
+                         time_limit=player.time_limit)
+        self.cancelled = False
+
+    def search_replies(self, board, move_count, replies):
+        """
+        Chooses the reply to each of the opponent's moves on board until every move has one or the search is cancelled.
+        The opponent's moves are tried in the order the search would try them, after the reply the transposition table
+        expects, so the moves the opponent is most likely to play are pondered first
+        :param board: The Board with the opponent to move. It is modified
+        :param move_count: The number of moves played already
+        :param replies: The dict that the row and column of each reply is stored in, under the (x_mask, o_mask, geometry)
+                        of the position after the opponent's move
+        """
+        geometry = board.geometry
+        depth = geometry.num_cells - move_count
+        self.start_search(board, depth, self.opponent_letter)
+        hash_cell = -1
+        if self.table is not None:
+            entry = self.table.lookup(self.position_key(board, self.opponent_letter))
+            if entry is not None and entry[3] != UPPER:
+                hash_cell = entry[2]
+        moves = self.order_moves(board, self.opponent_letter, 0, hash_cell, False)[0]
+        occupied = board.x_mask | board.o_mask
+        moves += [cell for cell in geometry.cell_order if not occupied & geometry.cell_bits[cell] and cell not in moves]
+        try:
+            for cell in moves:
+                won = board.make_move(cell, self.opponent_letter)
+                if not won and depth > 1:  # A move that ends the game has no reply
+                    move = self.choose_move(board, move_count + 1)
+                    if self.cancelled:  # An anytime search returns the move of an unfinished iteration when cancelled
+                        return
+                    replies[(board.x_mask, board.o_mask, geometry)] = move
+                board.unmake_move(cell, self.opponent_letter)
+        except SearchTimeout:
+            pass
+
+    def search(self, depth, alpha, beta, last_move_won, letter):
+        if self.cancelled:
+            raise SearchTimeout()
+        return super().search(depth, alpha, beta, last_move_won, letter)
+
+
+class RandomPlayer(Player):
+    """
+    A class that extends the Player class and represents a player that moves to a random unoccupied cell. It is used
+    as a fast, weak opponent in tournaments
+    """
+    def __init__(self, id, name, letter, seed=None):
+        """
+        :param id: An integer ID of the player, that corresponds to its index in the Game.players array
+        :param name: A string representing the name of the player
+        :param letter: A character representing the move this player makes. Player 1's letter is 'X' and player 2's letter is 'O'
+        :param seed: An optional seed for the random number generator, to make games reproducible
+        """
+        super().__init__(id, name, letter)
+        self.is_human = False
+        self.random = random.Random(seed)
+
+    def get_next_move(self, board_, move_count):
+        """
+        :param board_: The current board, either as a Board, a GameState or a matrix of characters
+        :param move_count: Unused parameter that is only included to allow the Game to call for the next move identically regardless of the player
+        :return: The row and column of a random unoccupied cell
+        """
+        board = ComputerPlayer.to_board(board_)
+        geometry = board.geometry
+        occupied = board.occupied()
+        empty_cells = [cell for cell in range(geometry.num_cells) if not occupied & geometry.cell_bits[cell]]
+        return geometry.cell_coords[self.random.choice(empty_cells)]
+
+
+DEFAULT_PLAYOUTS = 2000  # The number of playouts an MCTSPlayer runs per move when no budget is given
+EXPLORATION = 1.4  # The exploration constant of UCT. Larger values try less visited moves more often
+
+
+class MCTSNode:
+    """
+    A class to represent a position in the search tree of an MCTSPlayer. Results are counted for the player who made
+    the move that led to the position, so a parent picks the child that is best for the player to move at the parent
+    """
+    __slots__ = ("cell", "x_mask", "o_mask", "letter", "result", "children", "untried", "visits", "score")
+
+    def __init__(self, cell, x_mask, o_mask, letter, result, untried):
+        """
+        :param cell: The cell of the move that led to this position, or -1 at a root
+        :param x_mask: The mask of 'X' in this position
+        :param o_mask: The mask of 'O' in this position
+        :param letter: The letter of the player who made the move that led to this position
+        :param result: WINNER if that move completed a line, TIED if it filled the board, and IN_PROGRESS otherwise
+        :param untried: A list of the cells whose children have not been created yet
+        """
+        self.cell = cell
+        self.x_mask = x_mask
+        self.o_mask = o_mask
+        self.letter = letter
+        self.result = result
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.score = 0.0  # 1 for every playout won by self.letter and 0.5 for every drawn playout
+
+
+class MCTSPlayer(Player):
+    """
+    A class that extends the Player class and represents a computer player that chooses its moves with Monte Carlo tree
+    search. Each playout walks down the tree choosing moves by UCT, adds one new position, and finishes the game with
+    random moves. The work per move is set by a budget of playouts or milliseconds instead of the size of the game
+    tree, so it also plays on boards that are too large for minimax to search to the end. See the README for details
+    """
+    def __init__(self, id, name, letter, playouts=None, time_limit_ms=None, seed=None, exploration=EXPLORATION):
+        """
+        :param id: An integer ID of the player, that corresponds to its index in the Game.players array
+        :param name: A string representing the name of the player
+        :param letter: A character representing the move this player makes. Player 1's letter is 'X' and player 2's letter is 'O'
+        :param playouts: The number of playouts per move. Defaults to DEFAULT_PLAYOUTS if time_limit_ms is not given either
+        :param time_limit_ms: The number of milliseconds per move. When both budgets are given, the search stops at the first.
+                              At least one playout is run however small the budget is
+        :param seed: An optional seed for the random number generator, to make games reproducible
+        :param exploration: The exploration constant of UCT
+        :raises ValueError: If playouts or time_limit_ms is not positive
+        """
+        super().__init__(id, name, letter)
+        if playouts is not None and playouts < 1:
+            raise ValueError("playouts must be at least 1")
+        if time_limit_ms is not None and time_limit_ms <= 0:
+            raise ValueError("time_limit_ms must be positive")
+        self.is_human = False
+        if playouts is None and time_limit_ms is None:
+            playouts = DEFAULT_PLAYOUTS
+        self.playouts = playouts
+        self.time_limit_ms = time_limit_ms
+        self.exploration = exploration
+        self.random = random.Random(seed)
+        self.tree = None  # The MCTSNode of the position after this player's last move, whose subtree is reused on the next move
+        self.last_playouts = 0  # The number of playouts run by the last get_next_move
+        self.last_elapsed = 0.0  # The number of seconds the last get_next_move took
+        self.reused_visits = 0  # The number of playouts through the root that the last get_next_move kept from earlier moves
+
+    def get_next_move(self, board_, move_count):
+        """
+        :param board_: The current board, either as a Board, a GameState or a matrix of characters. It is never modified
+        :param move_count: Unused parameter that is only included to allow the Game to call for the next move identically regardless of the player
+        :return: The row and column of the move with the most playouts, or (-1, -1) if the game is over
+        """
+        start = time.perf_counter()
+        board = ComputerPlayer.to_board(board_)
+        geometry = board.geometry
+        root = self.find_root(board)
+        self.reused_visits = root.visits
+        deadline = None if self.time_limit_ms is None else start + self.time_limit_ms / 1000
+        playouts = 0
+        finished = board.has_won("X") or board.has_won("O")
+        while not finished and (root.untried or root.children):  # The budget is checked after the playout, so at least one runs
+            self.playout(root, geometry)
+            playouts += 1
+            if (self.playouts is not None and playouts >= self.playouts) or (deadline is not None and time.perf_counter() >= deadline):
+                break
+        self.last_playouts = playouts
+        self.last_elapsed = time.perf_counter() - start
+
+        if finished or not root.children:  # There is no move to play
+            self.tree = None
+            return -1, -1
+        best = max(root.children, key=lambda child: (child.visits, -child.cell))
+        self.tree = best
+        return geometry.cell_coords[best.cell]
+
+    def playouts_per_second(self):
+        """
+        :return: The rate of playouts of the last get_next_move
+        """
+        return self.last_playouts / self.last_elapsed if self.last_elapsed else 0.0
+
+    def find_root(self, board):
+        """
+        Finds the position of board among the children of the position after this player's last move, which is where
+        the tree continues after the opponent's reply. The tree is started again if it is not found, as in a new game
+        :return: The MCTSNode of board
+        """
+        tree = self.tree
+        if tree is not None:
+            for node in [tree] + tree.children:
+                if node.x_mask == board.x_mask and node.o_mask == board.o_mask:
+                    return node
+        occupied = board.x_mask | board.o_mask
+        untried = [cell for cell in range(board.geometry.num_cells) if not occupied & board.geometry.cell_bits[cell]]
+        return MCTSNode(-1, board.x_mask, board.o_mask, ComputerPlayer.alternate_letters(self.letter), IN_PROGRESS, untried)
+
+    def playout(self, root, geometry):
+        """
+        Runs one playout from root and adds its result to every position it passed through
+        """
+        # Selection: walk down through positions whose moves have all been tried, choosing the child with the best UCT value
+        node = root
+        path = [node]
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            exploration = self.exploration
+            node = max(node.children, key=lambda child: child.score / child.visits + exploration * math.sqrt(log_visits / child.visits))
+            path.append(node)
+
+        # Expansion: add the position after one untried move
+        if node.untried and node.result == IN_PROGRESS:
+            untried = node.untried
+            cell = untried.pop(self.random.randrange(len(untried)))
+            letter = ComputerPlayer.alternate_letters(node.letter)
+            x_mask, o_mask = node.x_mask, node.o_mask
+            if letter == "X":
+                x_mask |= geometry.cell_bits[cell]
+                won = geometry.completes_line(x_mask, cell)
+            else:
+                o_mask |= geometry.cell_bits[cell]
+                won = geometry.completes_line(o_mask, cell)
+            occupied = x_mask | o_mask
+            result = WINNER if won else TIED if occupied == geometry.full_mask else IN_PROGRESS
+            child_untried = []
+            if result == IN_PROGRESS:
+                child_untried = [c for c in range(geometry.num_cells) if not occupied & geometry.cell_bits[c]]
+            child = MCTSNode(cell, x_mask, o_mask, letter, result, child_untried)
+            node.children.append(child)
+            node = child
+            path.append(node)
+
+        winner = self.simulate(node, geometry)
+        for visited in path:
+            visited.visits += 1
+            if winner is None:
+                visited.score += 0.5
+            elif winner == visited.letter:
+                visited.score += 1.0
+
+    def simulate(self, node, geometry):
+        """
+        Finishes the game from node with uniformly random moves
+        :return: The letter of the winner, or None for a draw
+        """
+        if node.result == WINNER:
+            return node.letter
+        if node.result == TIED:
+            return None
+        x_mask, o_mask = node.x_mask, node.o_mask
+        occupied = x_mask | o_mask
+        cells = [cell for cell in range(geometry.num_cells) if not occupied & geometry.cell_bits[cell]]
+        self.random.shuffle(cells)
+        letter = node.letter
+        cell_bits = geometry.cell_bits
+        for cell in cells:
+            letter = "O" if letter == "X" else "X"
+            if letter == "X":
+                x_mask |= cell_bits[cell]
+                if geometry.completes_line(x_mask, cell):
+                    return letter
+            else:
+                o_mask |= cell_bits[cell]
+                if geometry.completes_line(o_mask, cell):
+                    return letter
+        return None
+
+
+class LearnerPlayer(Player):
+    """
+    A class that extends the Player class and represents a player that moves by a table of position values learned
+    through self-play (see learner.py). Every move costs one lookup of the values of the positions it can move to, so
+    it moves instantly on boards where minimax is too slow
+    """
+    def __init__(self, id, name, letter, table):
+        """
+        :param id: An integer ID of the player, that corresponds to its index in the Game.players array
+        :param name: A string representing the name of the player
+        :param letter: A character representing the move this player makes. Player 1's letter is 'X' and player 2's letter is 'O'
+        :param table: A learner.ValueTable trained on boards of the shape the player plays on
+        """
+        super().__init__(id, name, letter)
+        self.is_human = False
+        self.table = table
+
+    def get_next_move(self, board_, move_count):
+        """
+        :param board_: The current board, either as a Board, a GameState or a matrix of characters
+        :param move_count: Unused parameter that is only included to allow the Game to call for the next move identically regardless of the player
+        :return: The row and column of the move to the position with the highest learned value
+        """
+        board = ComputerPlayer.to_board(board_)
+        if board.geometry is not self.table.geometry:
+            raise ValueError("The table was trained on a " + repr(self.table.geometry) + " but the board is a " + repr(board.geometry))
+        return board.geometry.cell_coords[self.table.best_move(board.x_mask, board.o_mask, self.letter)]
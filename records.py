@@ -0,0 +1,249 @@
+import struct
+import sys
+from collections import namedtuple
+
+from bitboard import STANDARD, get_geometry
+from players import ComputerPlayer, HumanPlayer, LearnerPlayer, MCTSPlayer, RandomPlayer
+from tictactoe import Game, WON, DRAW
+
+"""
+A compact binary format for archiving played games, with a streaming writer and a streaming reader
+
+A file starts with a header of the magic bytes, a format version and the shape of the board (rows, cols, win_length),
+which every game in the file shares. Each game is then stored as
+
+    1 byte    the type of player 1 in the low 4 bits and the type of player 2 in the high 4 bits (see PLAYER_TYPES)
+    1 byte    the result in the low 2 bits (see RESULT_CODES), and bit 2 set if player 1 plays 'O' rather than 'X'
+    1 byte    the number of moves
+    n bytes   the cells of the moves, packed at move_bits() bits each (4 bits on a 3x3 board), first move in the low bits
+
+so a game on a 3x3 board takes at most 8 bytes. Files are written and read a game at a time, so they can be far larger
+than memory. Print a summary of a file with
+
+    python3 records.py games.ttr
+"""
+
+MAGIC = b"TTTR"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBB")  # Magic bytes, version, rows, cols, win length
+GAME_HEADER = struct.Struct("<BBB")  # Player types, result and letters, number of moves
+
+PLAYER_TYPES = ("human", "cpu", "table", "random", "mcts", "learner")  # A player type is stored as its index in this tuple
+RESULT_CODES = {None: 0, "X": 1, "O": 2, "draw": 3}  # Maps the winner's letter, "draw", or None for an unfinished game to its code
+CODE_RESULTS = {code: result for result, code in RESULT_CODES.items()}
+LETTER_FLAG = 0x04  # Set in the result byte when player 1 plays 'O'
+
+READ_SIZE = 1 << 16  # The number of bytes the reader reads from the file at a time
+
+GameRecord = namedtuple("GameRecord", ("player_1", "player_2", "letter_1", "moves", "result"))
+GameRecord.__doc__ = """
+A game read from a file: the types of the two players, the letter of player 1, a tuple of the cells played in order,
+and the result, which is the winner's letter, "draw", or None if the game was not finished
+"""
+
+
+def move_bits(geometry):
+    """
+    :return: The number of bits used to store one move on a board of geometry
+    """
+    return max(1, (geometry.num_cells - 1).bit_length())
+
+
+def player_type(player):
+    """
+    :return: The entry of PLAYER_TYPES that describes player
+    """
+    if isinstance(player, ComputerPlayer):
+        return "cpu" if player.solved_table is None else "table"
+    if isinstance(player, RandomPlayer):
+        return "random"
+    if isinstance(player, MCTSPlayer):
+        return "mcts"
+    if isinstance(player, LearnerPlayer):
+        return "learner"
+    if isinstance(player, HumanPlayer):
+        return "human"
+    raise ValueError("Players of type " + type(player).__name__ + " cannot be recorded")
+
+
+def game_moves(game):
+    """
+    :return: A list of the cells played so far in game, read from its history of GameStates
+    """
+    moves = []
+    for before, after in zip(game.history, game.history[1:]):
+        played = (before.x_mask | before.o_mask) ^ (after.x_mask | after.o_mask)
+        moves.append(played.bit_length() - 1)
+    return moves
+
+
+def game_result(game):
+    """
+    :return: The result of game as stored in a GameRecord
+    """
+    if game.status == WON:
+        return game.alternate_player().letter  # The player who made the last move won
+    if game.status == DRAW:
+        return "draw"
+    return None
+
+
+class RecordWriter:
+    """
+    A class to represent a file of game records being written. Games are encoded and written one at a time as they are
+    added. Pass a RecordWriter to Game.play_game to record the game, or add games with write() and write_game()
+    """
+    def __init__(self, file, geometry=STANDARD):
+        """
+        :param file: A path, or a binary file opened for writing. A file passed in is not closed by close()
+        :param geometry: The Geometry shared by every game in the file
+        """
+        if geometry.num_cells > 255:
+            raise ValueError("Game records support boards with at most 255 cells")
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, "wb") if self.owns_file else file
+        self.geometry = geometry
+        self.bits = move_bits(geometry)
+        self.count = 0  # The number of games written
+        self.file.write(HEADER.pack(MAGIC, VERSION, geometry.rows, geometry.cols, geometry.win_length))
+
+    def write(self, player_1, player_2, moves, result, letter_1="X"):
+        """
+        Writes one game
+        :param player_1: The type of player 1, one of PLAYER_TYPES
+        :param player_2: The type of player 2, one of PLAYER_TYPES
+        :param moves: The cells played, in order
+        :param result: The winner's letter, "draw", or None if the game was not finished
+        :param letter_1: The letter of player 1
+        """
+        packed = 0
+        for i, cell in enumerate(moves):
+            packed |= cell << (i * self.bits)
+        flags = RESULT_CODES[result] | (LETTER_FLAG if letter_1 == "O" else 0)
+        self.file.write(GAME_HEADER.pack(PLAYER_TYPES.index(player_1) | PLAYER_TYPES.index(player_2) << 4, flags, len(moves)))
+        self.file.write(packed.to_bytes((len(moves) * self.bits + 7) // 8, "little"))
+        self.count += 1
+
+    def write_game(self, game):
+        """
+        Writes a Game, finished or not
+        """
+        if game.geometry is not self.geometry:
+            raise ValueError("The game is played on a " + repr(game.geometry) + " but the file holds " + repr(self.geometry))
+        player_1, player_2 = game.players
+        self.write(player_type(player_1), player_type(player_2), game_moves(game), game_result(game), player_1.letter)
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_header(file):
+    """
+    Reads the header of a file of game records
+    :return: The Geometry of the games in the file
+    """
+    header = file.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError("The file is not a game record file")
+    magic, version, rows, cols, win_length = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("The file is not a game record file for this version")
+    return get_geometry(rows, cols, win_length)
+
+
+def read_records(file):
+    """
+    A generator of the games in a file of game records. The file is read in blocks of READ_SIZE bytes, so only the
+    games being decoded are held in memory
+    :param file: A path, or a binary file opened for reading positioned at the start of the records
+    :return: A generator of GameRecords
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            yield from read_records(f)
+        return
+    yield from decode_records(file, read_header(file))
+
+
+def decode_records(file, geometry):
+    """
+    A generator of the games in a file of game records whose header has already been read. See read_records()
+    """
+    bits = move_bits(geometry)
+    cell_mask = (1 << bits) - 1
+    buffer = b""
+    offset = 0
+    while True:
+        if len(buffer) - offset < GAME_HEADER.size + 255:  # Keep at least one whole game in the buffer
+            block = file.read(READ_SIZE)
+            buffer = buffer[offset:] + block
+            offset = 0
+            if not buffer:
+                return
+        if len(buffer) - offset < GAME_HEADER.size:
+            raise ValueError("The file ends in the middle of a game")
+        types, flags, num_moves = GAME_HEADER.unpack_from(buffer, offset)
+        offset += GAME_HEADER.size
+        size = (num_moves * bits + 7) // 8
+        if len(buffer) - offset < size:
+            raise ValueError("The file ends in the middle of a game")
+        packed = int.from_bytes(buffer[offset:offset + size], "little")
+        offset += size
+        moves = tuple((packed >> (i * bits)) & cell_mask for i in range(num_moves))
+        yield GameRecord(PLAYER_TYPES[types & 0x0F], PLAYER_TYPES[types >> 4], "O" if flags & LETTER_FLAG else "X", moves,
+                         CODE_RESULTS[flags & 0x03])
+
+
+def replay(record, geometry=STANDARD):
+    """
+    Plays the moves of a GameRecord into a new Game. The players are named after their types, but no player is asked
+    for a move
+    :param record: A GameRecord
+    :param geometry: The Geometry the game was played on
+    :return: The Game after the recorded moves
+    :raises ValueError: If a move is not legal, or the result of the moves differs from the recorded result
+    """
+    game = Game("player 1", "player 2", geometry.rows, geometry.cols, geometry.win_length)
+    game.players[0].name, game.players[1].name = record.player_1, record.player_2
+    for cell in record.moves:
+        game.apply_move(*geometry.cell_coords[cell])
+    if game_result(game) != record.result:
+        raise ValueError("The moves of the record do not lead to its result")
+    return game
+
+
+def replay_games(file):
+    """
+    A generator of the games in a file of game records, each replayed into a new Game. See replay()
+    :param file: A path, or a binary file opened for reading
+    :return: A generator of Games
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            yield from replay_games(f)
+        return
+    geometry = read_header(file)
+    for record in decode_records(file, geometry):
+        yield replay(record, geometry)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 records.py games.ttr")
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        shape = read_header(f)
+        results = {result: 0 for result in RESULT_CODES}
+        for game_record in decode_records(f, shape):
+            results[game_record.result] += 1
+    print(str(sum(results.values())) + " games on " + repr(shape) + ": " + str(results["X"]) + " won by X, " +
+          str(results["O"]) + " won by O, " + str(results["draw"]) + " drawn, " + str(results[None]) + " unfinished")
@@ -0,0 +1,99 @@
+class SearchStats:
+    """
+    A class to represent the statistics of one ComputerPlayer search. Depths are counted in moves from the position the
+    search started at, so index 0 of the per-depth lists is the root
+    """
+    def __init__(self, max_depth):
+        """
+        :param max_depth: The largest depth the search can reach, which is the number of unoccupied cells at the root
+        """
+        self.nodes_per_depth = [0] * (max_depth + 1)  # The number of positions visited at each depth
+        self.cutoffs_per_depth = [0] * (max_depth + 1)  # The number of alpha-beta cutoffs at each depth
+        self.leaf_evaluations = 0  # The number of positions scored by evaluation instead of searching their moves
+        self.table_hits = 0  # The number of positions answered by the transposition table
+        self.expanded_nodes = 0  # The number of positions whose moves were searched
+        self.symmetric_moves = 0  # The number of moves skipped because a symmetry of the position maps them onto another move
+        self.elapsed = 0.0  # The number of seconds the search took
+
+    def merge(self, other):
+        """
+        Adds the counts of another SearchStats with the same root to this one, such as one recorded by a worker process
+        of a parallel search
+        """
+        for depth, nodes in enumerate(other.nodes_per_depth):
+            self.nodes_per_depth[depth] += nodes
+        for depth, cutoffs in enumerate(other.cutoffs_per_depth):
+            self.cutoffs_per_depth[depth] += cutoffs
+        self.leaf_evaluations += other.leaf_evaluations
+        self.table_hits += other.table_hits
+        self.expanded_nodes += other.expanded_nodes
+        self.symmetric_moves += other.symmetric_moves
+
+    def nodes(self):
+        return sum(self.nodes_per_depth)
+
+    def cutoffs(self):
+        return sum(self.cutoffs_per_depth)
+
+    def branching_factor(self):
+        """
+        :return: The average number of moves searched from each expanded position. Alpha-beta cutoffs make this lower
+                 than the number of legal moves
+        """
+        return (self.nodes() - 1) / self.expanded_nodes if self.expanded_nodes else 0.0
+
+    def nodes_per_second(self):
+        return self.nodes() / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "nodes": self.nodes(),
+            "nodes_per_depth": list(self.nodes_per_depth),
+            "cutoffs_per_depth": list(self.cutoffs_per_depth),
+            "leaf_evaluations": self.leaf_evaluations,
+            "table_hits": self.table_hits,
+            "symmetric_moves": self.symmetric_moves,
+            "branching_factor": self.branching_factor(),
+            "elapsed": self.elapsed,
+        }
+
+
+class BatchStats:
+    """
+    A class to represent how a batch of move requests to ComputerPlayer.get_next_moves was answered
+    """
+    def __init__(self, requests):
+        """
+        :param requests: The number of boards in the batch
+        """
+        self.requests = requests
+        self.table_answers = 0  # The number of boards answered by a solved-position table without searching
+        self.exact_positions = 0  # The number of different positions among the searched boards
+        self.distinct_positions = 0  # The number of positions searched, after merging positions related by a symmetry
+        self.nodes = 0  # The number of positions visited by the searches
+        self.elapsed = 0.0  # The number of seconds the batch took
+
+    def duplicates(self):
+        """
+        :return: The number of boards that were answered from the search of another board
+        """
+        return self.requests - self.table_answers - self.distinct_positions
+
+    def deduplication_ratio(self):
+        """
+        :return: The number of searched boards per search. 1 means no board shared a search
+        """
+        searched = self.requests - self.table_answers
+        return searched / self.distinct_positions if self.distinct_positions else 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "table_answers": self.table_answers,
+            "exact_positions": self.exact_positions,
+            "distinct_positions": self.distinct_positions,
+            "duplicates": self.duplicates(),
+            "deduplication_ratio": self.deduplication_ratio(),
+            "nodes": self.nodes,
+            "elapsed": self.elapsed,
+        }
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+
+from bitboard import Board, get_geometry
+from players import ComputerPlayer
+from tictactoe import Game, IN_PROGRESS, WON, STATUS_NAMES
+
+"""
+An asyncio TCP server that hosts many concurrent games between remote human players and the computer player
+
+Each connection plays one game at a time. Clients send one JSON object per line and the server replies with one JSON
+object per line. Rows and columns are zero-indexed.
+
+    {"action": "new", "letter": "X", "rows": 3, "cols": 3, "win_length": 3}   Start a new game. letter is the client's
+                                                                               letter; the computer moves first if it is 'O'
+    {"action": "move", "row": 1, "col": 1}                                     Play a move. The reply includes the
+                                                                               computer's answer
+
+Every reply contains the board, the status ("in_progress", "won" or "draw"), the winner's letter if there is one, and
+the computer's move if it made one, or an "error" describing why the request was rejected. ComputerPlayer searches run
+in a process pool, so a slow search never stalls the event loop or the other games
+"""
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_MAX_PENDING_SEARCHES = 64  # Searches beyond this many wait in their session, which stops reading from its client
+MAX_LINE_LENGTH = 4096  # The longest request line accepted, in bytes
+MAX_BOARD_SIDE = 8  # The most rows or columns a requested board may have
+
+worker_players = {}  # Maps (letter, time_limit) to the ComputerPlayer of a worker process, so its transposition table stays warm
+
+
+def compute_move(x_mask, o_mask, rows, cols, win_length, move_count, letter, time_limit):
+    """
+    Chooses the computer's move. Runs in a worker process, so it only takes and returns plain values
+    :return: The zero-indexed row and column of the move
+    """
+    key = (letter, time_limit)
+    if key not in worker_players:
+        worker_players[key] = ComputerPlayer(0 if letter == "X" else 1, "cpu", letter, time_limit=time_limit)
+    board = Board(x_mask, o_mask, get_geometry(rows, cols, win_length))
+    return worker_players[key].get_next_move(board, move_count)
+
+
+class GameServer:
+    """
+    A class to represent the server. Start it with start() and stop it with close()
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, processes=None, max_sessions=DEFAULT_MAX_SESSIONS,
+                 max_pending_searches=DEFAULT_MAX_PENDING_SEARCHES, time_limit=None):
+        """
+        :param host: The address to listen on
+        :param port: The port to listen on. 0 picks a free port, which is available as self.port once started
+        :param processes: The number of search processes. Defaults to the number of cores
+        :param max_sessions: The number of connections served at once. Further connections are told the server is full
+        :param max_pending_searches: The number of computer searches submitted to the process pool at once
+        :param time_limit: The number of seconds the computer may spend on each move. Defaults to the limit Game uses
+        """
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.max_sessions = max_sessions
+        self.time_limit = time_limit
+        self.search_slots = asyncio.Semaphore(max_pending_searches)
+        self.sessions = 0  # The number of connections being served
+        self.executor = None
+        self.server = None
+
+    async def start(self):
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.processes)
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=MAX_LINE_LENGTH)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    async def handle_client(self, reader, writer):
+        """
+        Serves one connection until the client disconnects
+        """
+        if self.sessions >= self.max_sessions:
+            await self.send(writer, {"error": "The server is full. Try again later"})
+            writer.close()
+            return
+        self.sessions += 1
+        game = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # The line was longer than MAX_LINE_LENGTH
+                    await self.send(writer, {"error": "Request is too long"})
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Requests must be JSON objects")
+                    game, reply = await self.handle_request(game, request)
+                except (ValueError, TypeError, KeyError) as e:
+                    reply = {"error": str(e)}
+                    if game is not None:
+                        reply.update(self.describe(game))
+                await self.send(writer, reply)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def handle_request(self, game, request):
+        """
+        :param game: The Game of this connection, or None if none has been started
+        :param request: The decoded request
+        :return: A tuple of the Game of this connection after the request, and the reply
+        """
+        action = request.get("action")
+        if action == "new":
+            letter = request.get("letter", "X")
+            if letter not in ("X", "O"):
+                raise ValueError("letter must be X or O")
+            rows, cols = self.integer_field(request, "rows", 3), self.integer_field(request, "cols", 3)
+            if max(rows, cols) > MAX_BOARD_SIDE:
+                raise ValueError("Boards may have at most " + str(MAX_BOARD_SIDE) + " rows and columns")
+            win_length = None if request.get("win_length") is None else self.integer_field(request, "win_length")
+            names = ("human", "cpu") if letter == "X" else ("cpu", "human")
+            game = Game(*names, rows=rows, cols=cols, win_length=win_length, time_limit=self.time_limit)
+        elif action == "move":
+            if game is None:
+                raise ValueError("Start a game with the new action first")
+            if game.status == IN_PROGRESS and not game.cur_player.is_human:
+                raise ValueError("It is not your turn")
+            game.apply_move(self.integer_field(request, "row"), self.integer_field(request, "col"))
+        else:
+            raise ValueError("Unknown action " + str(action) + ". Valid actions are new and move")
+
+        computer_move = None
+        if game.status == IN_PROGRESS and not game.cur_player.is_human:
+            computer_move = await self.computer_move(game)
+            game.apply_move(*computer_move)
+        reply = self.describe(game)
+        reply["computer_move"] = computer_move
+        return game, reply
+
+    async def computer_move(self, game):
+        """
+        Runs the computer player's search in the process pool, waiting for a free search slot first
+        """
+        geometry = game.geometry
+        async with self.search_slots:
+            row, col = await asyncio.get_running_loop().run_in_executor(
+                self.executor, compute_move, game.bitboard.x_mask, game.bitboard.o_mask, geometry.rows, geometry.cols,
+                geometry.win_length, game.move_count, game.cur_player.letter, game.time_limit)
+        return [row, col]
+
+    @staticmethod
+    def integer_field(request, name, default=None):
+        """
+        Reads a field that must be a JSON integer. Floats, including ones such as 1e999 that int() cannot convert,
+        strings and booleans are rejected
+        :param default: The value of a missing or null field, or None if the field is required
+        :raises ValueError: If the field is required and missing, or is not an integer
+        """
+        value = request.get(name)
+        if value is None:
+            if default is None:
+                raise ValueError(name + " is required")
+            return default
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(name + " must be an integer")
+        return value
+
+    @staticmethod
+    def describe(game):
+        winner = game.alternate_player().letter if game.status == WON else None
+        return {"board": game.board, "status": STATUS_NAMES[game.status], "winner": winner}
+
+    @staticmethod
+    async def send(writer, reply):
+        writer.write(json.dumps(reply).encode() + b"\n")
+        await writer.drain()  # Wait while the client is not reading its replies
+
+
+async def main(args):
+    server = GameServer(args.host, args.port, args.processes, args.max_sessions, args.max_pending_searches, args.time_limit)
+    await server.start()
+    print("Serving Tic Tac Toe on " + args.host + ":" + str(server.port))
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Tic Tac Toe games over TCP with line-delimited JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--processes", type=int, default=None, help="The number of search processes. Defaults to the number of cores")
+    parser.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS)
+    parser.add_argument("--max-pending-searches", type=int, default=DEFAULT_MAX_PENDING_SEARCHES)
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds the computer may spend on each move")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,139 @@
+import mmap
+import os
+import struct
+import sys
+
+from bitboard import Board, CELL_BITS, NUM_CELLS, FULL_MASK, cell_index, has_line
+from players import ComputerPlayer, WINNER, LOSER, TIED, MIN, MAX
+from transposition import TranspositionTable
+
+"""
+A table of every reachable 3x3 position solved with minimax, stored as a compact binary file
+
+The file starts with a header of the magic bytes, a format version and the number of cells, followed by one byte per
+board in base 3 order (cell i contributes 3^i if it holds 'X' and 2 * 3^i if it holds 'O'). The low 4 bits of a byte are
+the best cell for the player to move and the high bits are the value of the position for that player. Unreachable and
+finished boards are stored as 0. Build the file once with
+
+    python3 solved.py [path]
+"""
+
+MAGIC = b"TTTS"
+VERSION = 1
+HEADER = struct.Struct("<4sBB")  # Magic bytes, version, number of cells
+NUM_ENTRIES = 3 ** NUM_CELLS
+
+NO_CELL = 0x0F
+VALUE_SHIFT = 4
+VALUE_CODES = {WINNER: 1, LOSER: 2, TIED: 3}  # 0 marks a board that is not in the table
+CODE_VALUES = {code: value for value, code in VALUE_CODES.items()}
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solved.bin")
+
+# BASE3[mask] is the base 3 number with a 1 at every set bit of mask, so a board's index is BASE3[x] + 2 * BASE3[o]
+BASE3 = tuple(sum(3 ** cell for cell in range(NUM_CELLS) if mask & CELL_BITS[cell]) for mask in range(FULL_MASK + 1))
+
+
+def board_index(x_mask, o_mask):
+    return BASE3[x_mask] + 2 * BASE3[o_mask]
+
+
+def reachable_positions():
+    """
+    Finds every position that can be reached in a game and is not yet finished
+    :return: A list of (x_mask, o_mask) pairs
+    """
+    positions = []
+    seen = set()
+    stack = [(0, 0)]
+    while stack:
+        x_mask, o_mask = stack.pop()
+        if (x_mask, o_mask) in seen:
+            continue
+        seen.add((x_mask, o_mask))
+        occupied = x_mask | o_mask
+        if has_line(x_mask) or has_line(o_mask) or occupied == FULL_MASK:
+            continue
+        positions.append((x_mask, o_mask))
+        x_to_move = bin(x_mask).count("1") == bin(o_mask).count("1")
+        for bit in CELL_BITS:
+            if not occupied & bit:
+                stack.append((x_mask | bit, o_mask) if x_to_move else (x_mask, o_mask | bit))
+    return positions
+
+
+def build(path=DEFAULT_PATH):
+    """
+    Solves every reachable position with ComputerPlayer.minimax and writes the table to path
+    :param path: The path of the file to write
+    :return: The number of positions solved
+    """
+    entries = bytearray(NUM_ENTRIES)
+    table = TranspositionTable(capacity=NUM_ENTRIES)
+    players = {letter: ComputerPlayer(0, "cpu", letter, table=table) for letter in ("X", "O")}
+    positions = reachable_positions()
+    for x_mask, o_mask in positions:
+        x_to_move = bin(x_mask).count("1") == bin(o_mask).count("1")
+        player = players["X" if x_to_move else "O"]
+        depth = NUM_CELLS - bin(x_mask | o_mask).count("1")
+        row, col, value = player.minimax(Board(x_mask, o_mask), depth, True, player.letter, MIN, MAX)
+        entries[board_index(x_mask, o_mask)] = (VALUE_CODES[value] << VALUE_SHIFT) | cell_index(row, col)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, NUM_CELLS))
+        f.write(entries)
+    os.replace(tmp_path, path)  # Replace the file atomically so processes that already mapped it are not disturbed
+    return len(positions)
+
+
+class SolvedTable:
+    """
+    A class to represent a solved-position file mapped into memory. The mapping is read only and backed by the file, so
+    every process that opens the same file shares one copy of it through the operating system's page cache
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        :param path: The path of a file written by build()
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) != HEADER.size + NUM_ENTRIES:
+            raise ValueError(path + " is not a solved-position table")
+        magic, version, num_cells = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or num_cells != NUM_CELLS:
+            raise ValueError(path + " is not a solved-position table for this version")
+
+    def lookup(self, x_mask, o_mask):
+        """
+        :return: A tuple of the best cell and the value of the position for the player to move, or None if the
+                 position is not in the table
+        """
+        entry = self.data[HEADER.size + BASE3[x_mask] + 2 * BASE3[o_mask]]
+        code = entry >> VALUE_SHIFT
+        if code == 0:
+            return None
+        return entry & NO_CELL, CODE_VALUES[code]
+
+    def close(self):
+        self.data.close()
+
+
+open_tables = {}  # Maps the absolute path of each opened table to its SolvedTable so the file is mapped once per process
+
+
+def load(path=DEFAULT_PATH):
+    """
+    Returns the SolvedTable for path, mapping the file the first time it is requested in this process
+    """
+    path = os.path.abspath(path)
+    if path not in open_tables:
+        open_tables[path] = SolvedTable(path)
+    return open_tables[path]
+
+
+if __name__ == "__main__":
+    out_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    count = build(out_path)
+    print("Solved " + str(count) + " positions into " + out_path)
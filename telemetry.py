@@ -0,0 +1,178 @@
+import bisect
+import json
+import os
+
+"""
+Telemetry sinks for the events of Game.play_game (see Game.add_sink for the events and their fields)
+
+JSONLinesSink writes every event as one line of JSON, for finding out what happened in a particular game.
+PrometheusSink aggregates the events into metrics and writes them in the Prometheus text exposition format, for a
+node exporter's textfile collector or any scraper that reads such a file:
+
+    game = Game("cpu", "cpu")
+    game.add_sink(telemetry.PrometheusSink("tictactoe.prom"))
+    game.play_game()
+
+The metrics are the time players spend choosing moves as a histogram per player type and letter, the games, moves and
+invalid moves played, games per second, and the share of games won by each letter and drawn
+"""
+
+DEFAULT_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                           2.5, 5.0, 10.0, 30.0, 60.0)  # The upper bounds, in seconds, of the move latency histogram
+METRIC_PREFIX = "tictactoe_"
+
+
+class JSONLinesSink:
+    """
+    A class to represent a sink that writes every event as a line of JSON
+    """
+    def __init__(self, file):
+        """
+        :param file: A path, which is appended to, or a text file opened for writing. A file passed in is not closed by close()
+        """
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, "a") if self.owns_file else file
+
+    def handle(self, event):
+        self.file.write(json.dumps(event) + "\n")
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class Histogram:
+    """
+    A class to represent a Prometheus histogram of one series
+    """
+    def __init__(self, buckets):
+        """
+        :param buckets: The sorted upper bounds of the buckets
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # counts[i] is the number of observations in bucket i but not in bucket i - 1
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """
+        :param name: The name of the metric
+        :param labels: The labels of the series, such as 'letter="X"', or "" for none
+        :return: The lines of the histogram in the text format. Bucket counts are cumulative, as the format requires
+        """
+        bucket_prefix = name + "_bucket{" + (labels + "," if labels else "")
+        series_labels = "{" + labels + "}" if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(bucket_prefix + 'le="' + format_value(bound) + '"} ' + str(cumulative))
+        lines.append(bucket_prefix + 'le="+Inf"} ' + str(self.count))
+        lines.append(name + "_sum" + series_labels + " " + format_value(self.total))
+        lines.append(name + "_count" + series_labels + " " + str(self.count))
+        return lines
+
+
+def format_value(value):
+    return repr(float(value))
+
+
+class PrometheusSink:
+    """
+    A class to represent a sink that aggregates events into metrics and writes them to a file in the Prometheus text
+    format. The file is rewritten at the end of every game, and can be written at any time with write()
+    """
+    def __init__(self, path=None, buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        :param path: The path of the metrics file, or None to only keep the metrics in memory. See render()
+        :param buckets: The upper bounds, in seconds, of the move latency histogram
+        """
+        self.path = path
+        self.buckets = tuple(sorted(buckets))
+        self.latency = {}  # Maps (player type, letter) to the Histogram of the seconds spent in get_next_move
+        self.game_seconds = Histogram(self.buckets)  # The wall-clock seconds of whole games
+        self.games = {"X": 0, "O": 0, "draw": 0}  # The number of finished games won by each letter and drawn
+        self.moves = 0  # The number of moves applied
+        self.invalid_moves = 0  # The number of moves to occupied cells that were asked for again
+        self.first_event_time = None  # The time.time() of the first event, from which games per second is measured
+        self.last_event_time = None
+
+    def handle(self, event):
+        name = event["event"]
+        if self.first_event_time is None:
+            self.first_event_time = event["time"]
+        self.last_event_time = event["time"]
+        if name == "move_chosen":
+            key = (event["player_type"], event["letter"])
+            if key not in self.latency:
+                self.latency[key] = Histogram(self.buckets)
+            self.latency[key].observe(event["seconds"])
+        elif name == "move_applied":
+            self.moves += 1
+        elif name == "invalid_move":
+            self.invalid_moves += 1
+        elif name == "game_end":
+            self.games[event["winner"] or "draw"] += 1
+            self.game_seconds.observe(event["seconds"])
+            if self.path is not None:
+                self.write()
+
+    def games_per_second(self):
+        """
+        :return: The number of finished games per second between the first and the last event
+        """
+        if self.first_event_time is None or self.last_event_time <= self.first_event_time:
+            return 0.0
+        return sum(self.games.values()) / (self.last_event_time - self.first_event_time)
+
+    def render(self):
+        """
+        :return: The metrics in the Prometheus text format
+        """
+        latency = METRIC_PREFIX + "move_latency_seconds"
+        lines = ["# HELP " + latency + " Seconds a player spent choosing a move in get_next_move",
+                 "# TYPE " + latency + " histogram"]
+        for (player_type, letter), histogram in sorted(self.latency.items()):
+            lines += histogram.lines(latency, 'player_type="' + player_type + '",letter="' + letter + '"')
+
+        game_seconds = METRIC_PREFIX + "game_duration_seconds"
+        lines += ["# HELP " + game_seconds + " Wall-clock seconds of a whole game", "# TYPE " + game_seconds + " histogram"]
+        lines += self.game_seconds.lines(game_seconds, "")
+
+        games = METRIC_PREFIX + "games_total"
+        lines += ["# HELP " + games + " Finished games by result", "# TYPE " + games + " counter"]
+        for result, count in self.games.items():
+            lines.append(games + '{result="' + ("draw" if result == "draw" else result.lower() + "_won") + '"} ' + str(count))
+
+        finished = sum(self.games.values())
+        for name, help_text, value in (
+                ("moves_total", "Moves applied", self.moves),
+                ("invalid_moves_total", "Moves to occupied cells that were asked for again", self.invalid_moves)):
+            lines += ["# HELP " + METRIC_PREFIX + name + " " + help_text, "# TYPE " + METRIC_PREFIX + name + " counter",
+                      METRIC_PREFIX + name + " " + str(value)]
+        for name, help_text, value in (
+                ("games_per_second", "Finished games per second since the first event", self.games_per_second()),
+                ("x_win_ratio", "Share of finished games won by X", self.games["X"] / finished if finished else 0.0),
+                ("o_win_ratio", "Share of finished games won by O", self.games["O"] / finished if finished else 0.0),
+                ("draw_ratio", "Share of finished games drawn", self.games["draw"] / finished if finished else 0.0)):
+            lines += ["# HELP " + METRIC_PREFIX + name + " " + help_text, "# TYPE " + METRIC_PREFIX + name + " gauge",
+                      METRIC_PREFIX + name + " " + format_value(value)]
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """
+        Writes the metrics to self.path. The file is replaced atomically, so a scraper never reads half of it
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
@@ -1,6 +1,31 @@
+import asyncio
+import io
+import json
+import os
+import pickle
+import tempfile
+import time
+from types import SimpleNamespace
 import unittest
-from tictactoe import Game, IN_PROGRESS, WON, DRAW, MAX_NUM_MOVES
-from players import Player, ComputerPlayer, HumanPlayer, WINNER, LOSER, TIED
+import tictactoe
+from tictactoe import Game, GameState, IN_PROGRESS, WON, DRAW, MAX_NUM_MOVES
+from players import Player, ComputerPlayer, HumanPlayer, LearnerPlayer, MCTSPlayer, RandomPlayer, WINNER, LOSER, TIED, MIN, MAX, \
+    SEARCH_WIN, INFINITY, MoveAnalysis, search_pools, close_search_pools
+from bitboard import Board, WIN_MASKS, has_line, get_geometry
+from transposition import TranspositionTable, EXACT, LOWER
+import records
+import telemetry
+import solved
+import tournament
+import benchmark
+import server
+
+try:
+    import numpy
+    import vecenv
+    import learner
+except ImportError:  # NumPy is an optional dependency that is only needed by vecenv and learner
+    numpy = None
 
 class TicTacToeTest(unittest.TestCase):
 
@@ -178,5 +203,605 @@ class TicTacToeTest(unittest.TestCase):
         self.assertNotEqual([row, col], [2,2], "Chose move that allows opponent to force a victory")
 
         # Check if chooses move to prevent loss
+
+    def test_bitboard(self):
+        # Test that the list-of-lists view round-trips through the bitboard
+        rows = [["X", "O", "-"], ["-", "X", "O"], ["-", "-", "X"]]
+        board = Board.from_rows(rows)
+        self.assertEqual(board.to_rows(), rows, "Bitboard does not round-trip the board")
+        self.assertEqual(board.get(1, 2), "O", "Bitboard returns the wrong letter for a cell")
+        self.assertTrue(board.is_empty(2, 0), "Bitboard does not recognize an unoccupied cell")
+        self.assertTrue(board.has_won("X"), "Bitboard does not recognize a win across the diagonal")
+        self.assertFalse(board.has_won("O"), "Bitboard recognizes a win that does not exist")
+
+        # Test that every win mask is recognized as a win and has exactly 3 cells
+        for win_mask in WIN_MASKS:
+            self.assertTrue(has_line(win_mask), "Win mask is not recognized as a win")
+            self.assertEqual(bin(win_mask).count("1"), 3, "Win mask does not contain 3 cells")
+
+    def test_make_unmake_move(self):
+        # Test that make_move updates the line counts and detects a win, and that unmake_move restores the board
+        board = Board.from_rows([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]])
+        self.assertEqual(board.x_counts[0], 2, "Line count of the top row is wrong")
+        before = board.copy()
+        self.assertFalse(board.make_move(5, "X"), "Move that completes no line was reported as a win")
+        board.unmake_move(5, "X")
+        self.assertTrue(board.make_move(2, "X"), "Move that completes the top row was not reported as a win")
+        self.assertTrue(board.has_won("X"), "Board does not recognize the completed top row")
+        self.assertTrue(board.completes_line(2, "X"), "Board does not recognize the line through the last move")
+        board.unmake_move(2, "X")
+        self.assertEqual(board, before, "unmake_move did not restore the masks")
+        self.assertEqual((board.x_counts, board.o_counts), (before.x_counts, before.o_counts),
+            "unmake_move did not restore the line counts")
+        self.assertEqual(Board(board.x_mask, board.o_mask).x_counts, board.x_counts,
+            "Line counts differ from counts computed from the masks")
+
+    def test_board_view(self):
+        # Test that the board view reflects moves and that modifying the returned matrix does not change the game
+        self.game.update_board(1, 1)
+        view = self.game.board
+        view[0][0] = "O"
+        self.assertEqual(self.game.board, [["-", "-", "-"], ["-", "X", "-"], ["-", "-", "-"]],
+            'Board view does not reflect the game')
+        self.assertEqual(self.game.bitboard, Board.from_rows(self.game.board), 'Board view and bitboard disagree')
+
+    def test_transposition_table(self):
+        # Test storing, looking up and counting hits and misses
+        table = TranspositionTable(capacity=2)
+        self.assertIsNone(table.lookup(1), "Empty table returned an entry")
+        table.store(1, 5, WINNER, 4, EXACT)
+        self.assertEqual(table.lookup(1), (5, WINNER, 4, EXACT), "Table returned the wrong entry")
+        self.assertEqual((table.hits, table.misses), (1, 1), "Table counted hits and misses incorrectly")
+
+        # Test that the least recently used entry is evicted once the table is full
+        table.store(2, 5, TIED, 0, LOWER)
+        table.lookup(1)
+        table.store(3, 5, LOSER, 8, EXACT)
+        self.assertEqual(len(table), 2, "Table grew past its capacity")
+        self.assertIsNone(table.lookup(2), "Table evicted the wrong entry")
+        self.assertIsNotNone(table.lookup(1), "Table evicted the most recently used entry")
+        self.assertEqual(table.evictions, 1, "Table counted evictions incorrectly")
+
+    def test_minimax_transposition_table(self):
+        # Test that the table cuts the nodes of the opening search without changing the move
+        plain = ComputerPlayer(0, "cpu", "X", table=None)
+        cached = ComputerPlayer(0, "cpu", "X", table=TranspositionTable())
+        self.assertEqual(cached.get_next_move(Board(), 0), plain.get_next_move(Board(), 0),
+            "Transposition table changed the opening move")
+        self.assertLess(cached.nodes_searched, plain.nodes_searched,
+            "Transposition table did not reduce the nodes of the opening search")
+
+        # Test that a repeated search is answered from the table
+        cached.nodes_searched = 0
+        cached.get_next_move(Board(), 0)
+        self.assertEqual(cached.nodes_searched, 1, "Repeated search was not answered from the table")
+
+    def test_move_ordering(self):
+        # Test that the opening search visits far fewer nodes than plain minimax, which visits 87223 without a table
+        player = ComputerPlayer(0, "cpu", "X", table=None)
+        self.assertEqual(player.get_next_move(Board(), 0), (0, 0), "Move ordering changed the opening move")
+        self.assertLess(player.nodes_searched, 2000, "Move ordering did not reduce the nodes of the opening search")
+
+        # Test that a winning move is listed alone, and that a threat of the opponent leaves only the blocking move
+        player.start_search(Board(), 9, "X")
+        board = Board.from_rows([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]])
+        self.assertEqual(player.order_moves(board, "X", 0, -1, True), ([2], True), "Winning move was not listed alone")
+        board = Board.from_rows([["X", "-", "-"], ["O", "O", "-"], ["X", "-", "-"]])
+        self.assertEqual(player.order_moves(board, "X", 0, -1, True), ([5], False), "Blocking move was not listed alone")
+        self.assertEqual(player.order_moves(board, "X", 0, -1, False)[0][:2], [5, 2],
+            "Moves were not ordered block first, then corners")
+
+        # Test that the search scores a faster win higher, while minimax still reports it as WINNER
+        board = Board.from_rows([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]])
+        player.start_search(board, 5, "X")
+        player.board = board.copy()
+        self.assertEqual(player.search_root(5, -INFINITY, INFINITY), (2, SEARCH_WIN - 1), "Search did not score a win in one move")
+        board = Board.from_rows([["X", "-", "-"], ["-", "O", "-"], ["-", "-", "X"]])
+        player.start_search(board, 6, "O")
+        player.board = board.copy()
+        self.assertEqual(player.search_root(6, -INFINITY, INFINITY)[1], TIED, "Search did not score a drawn position as TIED")
+        self.assertEqual(player.minimax(Board.from_rows([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]]), 5, True, "X", MIN, MAX),
+            [0, 2, WINNER], "Minimax did not report a forced win as WINNER")
+
+    def test_symmetric_moves(self):
+        # Test that the symmetries a position keeps are found, and that moves they map onto each other are searched once
+        geometry = get_geometry(3, 3)
+        self.assertEqual([len(geometry.kept_symmetries(x_mask, o_mask)) for x_mask, o_mask in ((0, 0), (1, 0), (1 << 4, 0), (1 | 1 << 8, 1 << 4))],
+            [7, 1, 7, 3], "Wrong symmetries kept by a position")
+        player = ComputerPlayer(0, "cpu", "X", table=None)
+        player.start_search(Board(), 9, "X")
+        self.assertEqual(player.distinct_moves(Board(), [4, 8, 6, 2, 0, 7, 5, 3, 1], False), [4, 8, 7],
+            "Empty board does not have a center, a corner and an edge move")
+        self.assertEqual(player.distinct_moves(Board(), [4, 8, 6, 2, 0, 7, 5, 3, 1], True), [4, 0, 1],
+            "Moves were not replaced by the lowest equivalent cell")
+        board = Board.from_rows([["X", "-", "-"], ["-", "-", "-"], ["-", "-", "-"]])
+        self.assertEqual(player.distinct_moves(board, [1, 2, 3, 4, 5, 6, 7, 8], False), [1, 2, 4, 5, 8],
+            "Moves mirrored in the diagonal through the corner were not removed")
+
+        # Test that every move still gets the score it has without symmetry, including the moves that were skipped
+        player = ComputerPlayer(1, "cpu", "O", table=None)
+        board = Board.from_rows([["X", "-", "-"], ["-", "-", "-"], ["-", "-", "-"]])
+        self.assertEqual([(cell, player.to_value(score)) for cell, score in player.root_move_scores(board, 8)],
+            [(1, LOSER), (2, LOSER), (3, LOSER), (4, TIED), (5, LOSER), (6, LOSER), (7, LOSER), (8, LOSER)],
+            "Symmetric moves were scored wrongly")
+
+    def test_analyze(self):
+        # Test that every move is scored with its value and the number of moves until the result
+        player = ComputerPlayer(0, "cpu", "X", table=None)
+        board = Board.from_rows([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]])
+        self.assertEqual(player.analyze(board, 4), [MoveAnalysis(0, 2, WINNER, 1), MoveAnalysis(1, 2, TIED, 5),
+                                                    MoveAnalysis(2, 0, LOSER, 2), MoveAnalysis(2, 1, LOSER, 2), MoveAnalysis(2, 2, LOSER, 2)],
+            "Wrong analysis of a position with a win, a draw and losses")
+        self.assertEqual(player.analyze(board, 4, top_k=2), player.analyze(board, 4)[:2], "Top moves differ from the full analysis")
+        with self.assertRaises(ValueError):
+            player.analyze(board, 4, top_k=0)
+
+        # Test that the values agree with a separate minimax search after each move
+        board = Board.from_rows([["X", "-", "-"], ["-", "-", "-"], ["-", "-", "-"]])
+        analysis = ComputerPlayer(1, "cpu", "O", table=None).analyze(board, 1)
+        self.assertEqual(len(analysis), 8, "Not every legal move was analyzed")
+        for move in analysis:
+            after = board.copy()
+            after.place(move.row, move.col, "O")
+            value = ComputerPlayer(0, "cpu", "X", table=None).minimax(after, 7, True, "X", MIN, MAX)[2]
+            self.assertEqual(move.value, -value, "Analysis disagrees with minimax on " + str(move))
+        self.assertEqual(analysis[0][:2], (1, 1), "The center is not the best reply to a corner")
+        self.assertEqual(player.analyze(Board.from_rows([["X", "X", "X"], ["O", "O", "-"], ["-", "-", "-"]]), 5), [],
+            "A finished game has moves")
+
+    def test_pondering(self):
+        # Test that every reply pondered on the empty board is the move a player that does not ponder chooses
+        player = ComputerPlayer(1, "cpu", "O", table=TranspositionTable(), ponder=True)
+        searcher = ComputerPlayer(1, "cpu", "O", table=None)
+        for cell in (0, 1, 4):
+            player.start_pondering(Board(), 0)
+            player.ponder_thread.join()  # Wait until every reply has been searched
+            self.assertEqual(len(player.pondered), 9, "Not every move of the opponent was pondered")
+            board = Board()
+            board.make_move(cell, "X")
+            nodes = player.nodes_searched
+            self.assertEqual(player.get_next_move(board, 1), searcher.get_next_move(board, 1), "Pondered reply differs from the search")
+            self.assertEqual(player.nodes_searched, nodes, "A pondered reply was searched again")
+        self.assertEqual((player.ponder_hits, player.ponder_misses), (3, 0), "Pondered replies were not used")
+
+        # Test that a move pondering has not reached cancels it and is searched instead
+        player = ComputerPlayer(1, "cpu", "O", table=TranspositionTable(), time_limit=0.1, ponder=True)
+        board = Board(geometry=get_geometry(4, 4))
+        player.start_pondering(board, 0)
+        board.place(3, 3, "X")
+        row, col = player.get_next_move(board, 1)
+        self.assertTrue(board.is_empty(row, col), "Searched reply is not a legal move")
+        self.assertEqual((player.ponder_hits, player.ponder_misses), (0, 1), "An unpondered move was not counted as a miss")
+        self.assertIsNone(player.ponder_thread, "Pondering was not stopped")
+
+        # Test that a game only ponders while a human chooses, and stops pondering when it ends
+        game = Game("cpu", "cpu", ponder=True)
+        game.play_game(verbose=False)
+        self.assertEqual([(p.ponder_hits, p.ponder_misses, p.ponder_thread) for p in game.players], [(0, 0, None)] * 2,
+            "Computer players pondered without a human opponent")
+
+    def test_game_state(self):
+        # Test that apply returns a new state and leaves the original unchanged
+        empty = GameState()
+        state = empty.apply(4)
+        self.assertEqual((empty.x_mask, empty.move_count), (0, 0), "apply modified the original state")
+        self.assertEqual((state.x_mask, state.letter_to_move), (1 << 4, "O"), "apply did not play for X")
+        for cell in (1, 0, 2):
+            state = state.apply(cell)
+        self.assertEqual(state.apply(8).status, WON, "apply did not recognize a diagonal win")
+        with self.assertRaises(ValueError):
+            state.apply(4)
+
+        # Test that states reached by different move orders are equal, hash alike, and survive pickling
+        self.assertEqual(state, GameState().apply(0).apply(2).apply(4).apply(1), "Transposed states are not equal")
+        self.assertEqual(len({state, GameState.from_board(state.to_board())}), 1, "Equal states hash differently")
+        self.assertIs(pickle.loads(pickle.dumps(state)).geometry, state.geometry, "Unpickled state has its own Geometry")
+
+        # Test that players take a GameState in place of a Board
+        game = Game("player 1", "player 2")
+        game.apply_move(0, 0)
+        game.apply_move(1, 1)
+        player = ComputerPlayer(0, "cpu", "X", table=None)
+        self.assertEqual(player.get_next_move(game.state, 2), player.get_next_move(game.bitboard, 2),
+            "A GameState gives a different move than its Board")
+        self.assertEqual(player.analyze(game.state, 2), player.analyze(game.bitboard, 2), "A GameState gives a different analysis")
+        row, col = MCTSPlayer(0, "mcts", "X", playouts=50, seed=0).get_next_move(game.state, 2)
+        self.assertTrue(game.bitboard.is_empty(row, col), "MCTS chose an occupied cell of a GameState")
+        self.assertEqual(ComputerPlayer.to_board(game.state), game.bitboard, "A GameState converts to the wrong Board")
+
+    def test_undo_redo(self):
+        # Test that moves can be taken back and played again, and that a new move clears the moves to redo
+        game = Game("player 1", "player 2")
+        game.apply_move(1, 1)
+        game.apply_move(0, 0)
+        game.undo()
+        self.assertEqual((game.move_count, game.cur_player.letter), (1, "O"), "undo did not take back the move")
+        self.assertTrue(game.bitboard.is_empty(0, 0), "undo did not empty the cell")
+        game.redo()
+        self.assertEqual(game.board[0][0], "O", "redo did not play the move again")
+        game.undo()
+        game.apply_move(2, 2)
+        with self.assertRaises(ValueError):
+            game.redo()
+        game.undo()
+        game.undo()
+        self.assertEqual(game.state, GameState(), "undo did not return to the empty board")
+        with self.assertRaises(ValueError):
+            game.undo()
+
+    def test_game_records(self):
+        # Test that recorded games are read back and replayed with the same moves and results
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.ttr")
+            with records.RecordWriter(path) as writer:
+                game = Game("cpu", "cpu")
+                game.play_game(verbose=False, recorder=writer)
+                writer.write("human", "random", [4, 0, 8], None)
+            self.assertEqual(os.path.getsize(path), records.HEADER.size + 8 + 5, "Games were not packed at 4 bits per move")
+
+            read = list(records.read_records(path))
+            self.assertEqual(read[0], records.GameRecord("cpu", "cpu", "X", tuple(records.game_moves(game)), "draw"),
+                "Recorded game was not read back")
+            self.assertEqual(read[1], records.GameRecord("human", "random", "X", (4, 0, 8), None),
+                "Unfinished game was not read back")
+            replayed = list(records.replay_games(path))
+            self.assertEqual(replayed[0].board, game.board, "Replayed game has a different board")
+            self.assertEqual(replayed[1].move_count, 3, "Replayed game has the wrong number of moves")
+
+        with self.assertRaises(ValueError):
+            list(records.read_records(io.BytesIO(b"not a record file")))
+
+    def test_parallel_search(self):
+        # Test that splitting the root moves across processes chooses the same moves as the serial search
+        self.addCleanup(close_search_pools)
+        serial = ComputerPlayer(0, "cpu", "O", table=None)
+        parallel = ComputerPlayer(0, "cpu", "O", table=None, workers=2)
+        for rows in ([["X", "-", "-"], ["-", "-", "-"], ["-", "-", "-"]], [["X", "-", "-"], ["-", "O", "-"], ["-", "-", "X"]],
+                     [["X", "X", "-"], ["-", "O", "-"], ["-", "-", "-"]], [["X", "O", "X"], ["-", "O", "-"], ["-", "X", "-"]]):
+            move_count = sum(row.count("X") + row.count("O") for row in rows)
+            self.assertEqual(parallel.get_next_move(rows, move_count), serial.get_next_move(rows, move_count),
+                "Parallel search chose a different move on " + str(rows))
+        pool = search_pools[2][0]
+
+        # Test that the pool is kept between moves, and that the statistics of the workers are combined
+        move, stats = ComputerPlayer(1, "cpu", "X", table=None, workers=2).get_next_move_with_stats(Board(), 0)
+        self.assertIs(search_pools[2][0], pool, "Parallel search started a new pool")
+        self.assertEqual(move, serial.get_next_move(Board(), 0), "Parallel search chose a different opening move")
+        self.assertEqual(stats.nodes_per_depth[1], 3, "Worker statistics were not combined")
+        for rows in ([["X", "X", "X"], ["O", "O", "-"], ["-", "-", "-"]], [["X", "O", "X"], ["X", "O", "O"], ["O", "X", "X"]]):
+            move_count = sum(row.count("X") + row.count("O") for row in rows)
+            self.assertEqual(parallel.get_next_move(rows, move_count), (-1, -1), "Parallel search moved on the finished board " + str(rows))
+
+        # Test that an anytime search can be split across processes
+        player = ComputerPlayer(0, "cpu", "X", table=TranspositionTable(), time_limit=0.5, workers=2)
+        board = Board.from_rows([["X", "X", "-", "-"], ["O", "O", "O", "-"], ["X", "-", "-", "-"], ["-", "-", "-", "-"]])
+        self.assertEqual(player.get_next_move(board, 6), (1, 3), "Parallel anytime search did not block the opponent")
+
+    def test_mcts_player(self):
+        # Test that the Monte Carlo player takes a win, blocks a loss and keeps to its playout budget
+        player = MCTSPlayer(0, "mcts", "X", playouts=500, seed=0)
+        self.assertEqual(player.get_next_move([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]], 4), (0, 2),
+            "MCTS did not choose the winning move")
+        self.assertEqual(player.last_playouts, 500, "MCTS did not run its playout budget")
+        self.assertGreater(player.playouts_per_second(), 0, "MCTS did not report its playout rate")
+        player = MCTSPlayer(0, "mcts", "X", playouts=500, seed=0)
+        self.assertEqual(player.get_next_move([["X", "-", "-"], ["O", "O", "-"], ["X", "-", "-"]], 4), (1, 2),
+            "MCTS did not block the opponent")
+
+        # Test that the tree below the opponent's reply is kept for the next move
+        game = Game("player 1", "player 2")
+        game.players = [MCTSPlayer(0, "mcts", "X", playouts=2000, seed=1), RandomPlayer(1, "random", "O", seed=1)]
+        game.cur_player = game.players[0]
+        game.play_move()
+        game.play_move()
+        game.play_move()
+        self.assertGreater(game.players[0].reused_visits, 0, "MCTS did not reuse the tree of its last move")
+
+        # Test that a time budget bounds the search on a board too large for minimax
+        player = MCTSPlayer(0, "mcts", "X", time_limit_ms=200, seed=0)
+        start = time.perf_counter()
+        player.get_next_move(Board(geometry=get_geometry(7, 7, 5)), 0)
+        self.assertLess(time.perf_counter() - start, 0.5, "MCTS overran its time budget")
+
+        # Test that a budget too small for one playout still runs one, and that a finished game has no move
+        for rows, cols in ((3, 3), (7, 7), (15, 15)):
+            player = MCTSPlayer(0, "mcts", "X", time_limit_ms=0.001, seed=0)
+            board = Board(geometry=get_geometry(rows, cols))
+            self.assertTrue(board.is_empty(*player.get_next_move(board, 0)), "MCTS did not choose a legal move")
+            self.assertEqual(player.last_playouts, 1, "MCTS did not run exactly one playout")
+        player = MCTSPlayer(0, "mcts", "X", playouts=10, seed=0)
+        self.assertEqual(player.get_next_move([["X", "X", "X"], ["O", "O", "-"], ["-", "-", "-"]], 5), (-1, -1),
+            "MCTS moved after the game was won")
+        self.assertEqual(player.get_next_move([["X", "O", "X"], ["X", "O", "O"], ["O", "X", "X"]], 9), (-1, -1),
+            "MCTS moved on a full board")
+        for budget in ({"playouts": 0}, {"time_limit_ms": 0}, {"time_limit_ms": -5}):
+            with self.assertRaises(ValueError):
+                MCTSPlayer(0, "mcts", "X", **budget)
+
+    def test_batched_moves(self):
+        # Test that boards in the same position, or in rotations and reflections of it, share one search
+        player = ComputerPlayer(0, "cpu", "O", table=TranspositionTable())
+        corners = [[["X" if (r, c) == corner else "-" for c in range(3)] for r in range(3)] for corner in ((0, 0), (0, 2), (2, 0), (2, 2))]
+        boards = corners + [Board.from_rows(corners[0]), [["-", "-", "-"], ["-", "X", "-"], ["-", "-", "-"]]]
+        moves, stats = player.get_next_moves_with_stats(boards)
+        self.assertEqual(moves, [ComputerPlayer(0, "cpu", "O", table=None).get_next_move(board, 1) for board in boards],
+            "Batched moves differ from the moves of get_next_move")
+        self.assertEqual((stats.requests, stats.exact_positions, stats.distinct_positions, stats.duplicates()), (6, 5, 2, 4),
+            "Batch was not deduplicated by symmetry")
+        self.assertEqual(stats.deduplication_ratio(), 3.0, "Wrong deduplication ratio")
+        finished = [[["X", "X", "X"], ["O", "O", "-"], ["-", "-", "-"]], [["X", "O", "X"], ["X", "O", "O"], ["O", "X", "X"]]]
+        moves = player.get_next_moves(finished + corners[:1])
+        self.assertEqual(moves, [(-1, -1), (-1, -1), ComputerPlayer(0, "cpu", "O", table=None).get_next_move(corners[0], 1)],
+            "Batched moves on finished boards differ from get_next_move")
+
+        # Test the canonical form of positions on a rectangular board, which has 4 symmetries
+        geometry = get_geometry(3, 4)
+        self.assertEqual(len(geometry.symmetries), 4, "Wrong number of symmetries of a 3x4 board")
+        self.assertEqual(geometry.canonical(1 << 11, 0)[:2], geometry.canonical(1 << 0, 0)[:2],
+            "Opposite corners have different canonical forms")
+
+    def test_telemetry(self):
+        # Test that a game reports its moves, including a move to an occupied cell, and its result to every sink
+        game = Game("player 1", "cpu")
+        scripted = [(0, 0), (0, 0)]  # The second move is to the cell of the first, so it is asked for again
+        game.players[0].get_next_move = lambda board, move_count: scripted.pop(0) if scripted else \
+            next((r, c) for r in range(3) for c in range(3) if board.is_empty(r, c))
+        events = []
+        lines = io.StringIO()
+        metrics = telemetry.PrometheusSink()
+        for sink in (SimpleNamespace(handle=events.append), telemetry.JSONLinesSink(lines), metrics):
+            game.add_sink(sink)
+        game.play_game(verbose=False)
+        names = [event["event"] for event in events]
+        self.assertEqual((names[0], names[-1]), ("game_start", "game_end"), "Game did not start and end its events")
+        self.assertEqual(names.count("move_applied"), game.move_count, "Not every move was reported")
+        self.assertEqual(names.count("invalid_move"), 1, "Move to an occupied cell was not reported")
+        self.assertEqual(names.count("move_chosen"), names.count("move_requested"), "Chosen moves do not match requests")
+        self.assertEqual(events[-1]["winner"], game.alternate_player().letter if game.status == WON else None,
+            "Wrong winner reported")
+        self.assertEqual([json.loads(line) for line in lines.getvalue().splitlines()], events,
+            "JSON lines differ from the events")
+
+        # Test that the metrics add up in the Prometheus text format
+        text = metrics.render()
+        self.assertIn('tictactoe_move_latency_seconds_count{player_type="ComputerPlayer",letter="O"} ' +
+                      str(sum(event["event"] == "move_chosen" and event["letter"] == "O" for event in events)), text,
+                      "Move latency histogram has the wrong count")
+        self.assertIn("tictactoe_invalid_moves_total 1\n", text, "Invalid moves were not counted")
+        self.assertIn("tictactoe_moves_total " + str(game.move_count) + "\n", text, "Moves were not counted")
+        ratio = "tictactoe_draw_ratio 1.0\n" if game.status == DRAW else "tictactoe_draw_ratio 0.0\n"
+        self.assertIn(ratio, text, "Wrong draw ratio")
+
+        # Test that the metrics file is written at the end of every game
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tictactoe.prom")
+            game = Game("cpu", "cpu")
+            game.add_sink(telemetry.PrometheusSink(path))
+            game.play_game(verbose=False)
+            with open(path) as f:
+                self.assertIn('tictactoe_games_total{result="draw"} 1\n', f.read(), "Metrics file was not written")
+
+    def test_solved_table(self):
+        # Test that the solved-position table answers moves without searching and agrees with minimax
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "solved.bin")
+            self.assertEqual(solved.build(path), 4520, "Solved the wrong number of reachable positions")
+            table = solved.SolvedTable(path)
+            self.assertEqual(table.lookup(0, 0)[1], TIED, "Empty board is not solved as a tie")
+
+            board = Board.from_rows([["X", "-", "O"], ["X", "-", "O"], ["-", "-", "-"]])
+            self.assertEqual(table.lookup(board.x_mask, board.o_mask), (6, WINNER),
+                "Table does not contain the winning move")
+
+            player = ComputerPlayer(0, "cpu", "X", table=None, solved_table=table)
+            searcher = ComputerPlayer(0, "cpu", "X", table=None)
+            rows = [["-", "-", "-"], ["-", "O", "X"], ["-", "X", "O"]]
+            self.assertEqual(player.get_next_move(rows, 4), searcher.get_next_move(rows, 4),
+                "Table move differs from the minimax move")
+            self.assertEqual(player.nodes_searched, 0, "Player searched a position that is in the table")
+            table.close()
+
+    def test_geometry(self):
+        # Test the number of win lines on boards of different shapes
+        self.assertEqual(len(get_geometry(3, 3).win_masks), 8, "Wrong number of win lines on a 3x3 board")
+        self.assertEqual(len(get_geometry(4, 4).win_masks), 10, "Wrong number of win lines on a 4x4 board")
+        self.assertEqual(len(get_geometry(5, 5, 4).win_masks), 28, "Wrong number of win lines on a 5x5 board with 4 in a row")
+        self.assertIs(get_geometry(4, 4), get_geometry(4, 4, 4), "Boards of the same shape do not share a Geometry")
+        with self.assertRaises(ValueError):
+            get_geometry(3, 3, 4)
+
+    def test_large_board(self):
+        # Test that check_status recognizes wins and in progress games on a 4x4 board with 4 in a row
+        game = Game("player 1", "player 2", rows=4, cols=4)
+        game.board = [["X", "-", "-", "-"], ["-", "X", "-", "-"], ["-", "-", "X", "-"], ["-", "-", "-", "X"]]
+        game.move_count = 7
+        self.assertEqual(game.check_status(3, 3), WON, 'Board doesnt recognize a 4x4 diagonal win')
+        game.board = [["X", "X", "X", "-"], ["-", "-", "-", "-"], ["-", "-", "-", "-"], ["-", "-", "-", "-"]]
+        self.assertEqual(game.check_status(0, 2), IN_PROGRESS, 'Board recognizes 3 in a row as a 4x4 win')
+
+        # Test that the human player validates input against the size of the board
+        self.assertEqual(HumanPlayer.choices(4), ("1", "2", "3", "4"), "Wrong valid inputs for 4 rows")
+        self.assertEqual(HumanPlayer.describe_choices(3), "1, 2, and 3", "Wrong description of 3 rows")
+
+    def test_iterative_deepening(self):
+        # Test that the anytime search finds a winning move and a block on a 4x4 board within its time budget
+        player = ComputerPlayer(0, "cpu", "X", table=TranspositionTable(), time_limit=0.5)
+        board = Board.from_rows([["X", "X", "X", "-"], ["O", "O", "O", "-"], ["-", "-", "-", "-"], ["-", "-", "-", "-"]])
+        self.assertEqual(player.get_next_move(board, 6), (0, 3), "Anytime search did not choose the winning move")
+        board = Board.from_rows([["X", "X", "-", "-"], ["O", "O", "O", "-"], ["X", "-", "-", "-"], ["-", "-", "-", "-"]])
+        start = time.perf_counter()
+        self.assertEqual(player.get_next_move(board, 6), (1, 3), "Anytime search did not block the opponent")
+        self.assertLess(time.perf_counter() - start, 1.0, "Anytime search overran its time budget")
+        self.assertGreaterEqual(player.completed_depth, 1, "Anytime search did not complete an iteration")
+
+        # Test that a finished game has no move, as with minimax
+        player = ComputerPlayer(0, "cpu", "X", table=TranspositionTable(), time_limit=0.1)
+        self.assertEqual(player.get_next_move([["X", "O", "X"], ["X", "O", "O"], ["O", "X", "X"]], 9), (-1, -1),
+            "Anytime search moved on a full board")
+        self.assertEqual(player.get_next_move([["X", "X", "X"], ["O", "O", "-"], ["-", "-", "-"]], 5), (-1, -1),
+            "Anytime search moved after the game was won")
+
+    def test_search_stats(self):
+        # Test that statistics add up and that the callback receives them
+        received = []
+        player = ComputerPlayer(0, "cpu", "X", table=None, stats_callback=received.append)
+        move, stats = player.get_next_move_with_stats(Board(), 0)
+        self.assertEqual(received, [stats], "Stats callback did not receive the statistics")
+        self.assertIs(player.last_stats, stats, "Statistics were not recorded in last_stats")
+        self.assertEqual(stats.nodes(), player.nodes_searched, "Statistics counted the wrong number of nodes")
+        self.assertEqual(stats.nodes_per_depth[0], 1, "Statistics counted more than one root")
+        self.assertEqual(stats.nodes_per_depth[1], 3, "Statistics did not count the distinct moves from the empty board")
+        self.assertGreaterEqual(stats.symmetric_moves, 6, "Statistics did not count the moves skipped by symmetry")
+        self.assertGreater(stats.cutoffs(), 0, "Statistics did not count alpha-beta cutoffs")
+        self.assertEqual(stats.leaf_evaluations + stats.expanded_nodes, stats.nodes(),
+            "Every node should be either a leaf or expanded")
+        self.assertTrue(1 < stats.branching_factor() < 9, "Branching factor is out of range")
+        self.assertEqual(player.get_next_move(Board(), 0), move, "Collecting statistics changed the move")
+
+        # Test that no statistics are collected by default
+        player = ComputerPlayer(0, "cpu", "X")
+        player.get_next_move(Board(), 0)
+        self.assertIsNone(player.last_stats, "Statistics were collected when disabled")
+
+    def test_play_game_headless(self):
+        # Test that a game between computer players runs to a draw without printing and returns no winner
+        game = Game("cpu", "cpu")
+        self.assertIsNone(game.play_game(verbose=False), "A game between computer players did not end in a draw")
+        self.assertEqual(game.status, DRAW, "A game between computer players did not end in a draw")
+        self.assertEqual(game.move_count, MAX_NUM_MOVES, "A drawn game did not fill the board")
+
+    def test_tournament(self):
+        # Test that computer players never lose and that the results add up
+        result = tournament.run_tournament("cpu", "random", 50, processes=1, seed=1)
+        self.assertEqual(result.games, 50, "Tournament played the wrong number of games")
+        self.assertEqual(result.wins[0] + result.wins[1] + result.draws, 50, "Tournament results do not add up")
+        self.assertEqual(result.losses(0), 0, "Computer player lost a game")
+        self.assertGreater(result.average_move_latency(0), 0, "Tournament did not time the moves")
+
+        # Test that games are reproducible with a seed and that a process pool gives the same results
+        pooled = tournament.run_tournament("random", "random", 40, processes=2, chunk_size=10, seed=3)
+        serial = tournament.run_tournament("random", "random", 40, processes=1, chunk_size=10, seed=3)
+        self.assertEqual((pooled.wins, pooled.draws), (serial.wins, serial.draws),
+            "Process pool and serial tournaments disagree")
+        with self.assertRaises(ValueError):
+            tournament.run_tournament("cpu", "unknown", 1, processes=1)
+
+        # Test that computer players on a board other than 3x3 get the time limit Game gives them instead of searching
+        # to the end of the game, which would not finish on a 5x5 board
+        large_board_time_limit = tictactoe.LARGE_BOARD_TIME_LIMIT
+        tictactoe.LARGE_BOARD_TIME_LIMIT = 0.02
+        try:
+            result = tournament.run_tournament("cpu", "random", 1, processes=1, rows=5, cols=5, win_length=4, seed=1)
+        finally:
+            tictactoe.LARGE_BOARD_TIME_LIMIT = large_board_time_limit
+        self.assertEqual(result.games, 1, "Tournament on a 5x5 board did not finish")
+        self.assertLess(result.average_move_latency(0), 0.5, "Computer player ignored the time limit of a 5x5 board")
+
+    def test_benchmark_compare(self):
+        # Test that only benchmarks that got worse by more than the threshold are reported as regressions
+        baseline = {"latency": {"value": 1.0, "unit": "s", "higher_is_better": False},
+                    "speed": {"value": 100.0, "unit": "calls/s", "higher_is_better": True}}
+        results = {"latency": {"value": 1.2, "unit": "s", "higher_is_better": False},
+                   "speed": {"value": 60.0, "unit": "calls/s", "higher_is_better": True},
+                   "new": {"value": 5.0, "unit": "calls/s", "higher_is_better": True}}
+        regressions = benchmark.compare(results, baseline, threshold=0.25)
+        self.assertEqual([name for name, _, _, _ in regressions], ["speed"], "Wrong benchmarks reported as regressions")
+        self.assertEqual(benchmark.compare(results, baseline, threshold=0.1)[0][0], "latency",
+            "Latency regression was not reported")
+
+    def test_server(self):
+        # Test two concurrent games against the server, including an invalid move
+        async def request(reader, writer, message):
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        async def play():
+            game_server = server.GameServer(port=0, processes=1)
+            await game_server.start()
+            try:
+                first = await asyncio.open_connection("127.0.0.1", game_server.port)
+                second = await asyncio.open_connection("127.0.0.1", game_server.port)
+                replies = await asyncio.gather(request(*first, {"action": "new", "letter": "X"}),
+                                               request(*second, {"action": "new", "letter": "O"}))
+                self.assertIsNone(replies[0]["computer_move"], "Computer moved first when playing O")
+                self.assertEqual(replies[1]["computer_move"], [0, 0], "Computer did not open when playing X")
+
+                reply = await request(*second, {"action": "move", "row": 0, "col": 0})
+                self.assertIn("error", reply, "Server accepted a move to an occupied location")
+                reply = await request(*first, {"action": "move", "row": 1, "col": 1})
+                self.assertEqual(reply["status"], "in_progress", "Game ended after one move each")
+                self.assertEqual(sum(row.count("-") for row in reply["board"]), 7, "Board does not have two moves")
+                reply = await request(*first, {"action": "jump"})
+                self.assertIn("error", reply, "Server accepted an unknown action")
+                for message in ({"action": "move", "row": float("inf"), "col": 0}, {"action": "move", "row": 2.0, "col": 0},
+                                {"action": "move", "row": "2", "col": 0}, {"action": "move", "row": 2},
+                                {"action": "new", "rows": 1e300}):
+                    reply = await request(*first, message)
+                    self.assertIn("error", reply, "Server accepted a request with a field that is not an integer: " + str(message))
+                reply = await request(*first, {"action": "move", "row": 2, "col": 2})
+                self.assertNotIn("error", reply, "Session did not survive the invalid requests")
+                for _, writer in (first, second):
+                    writer.close()
+            finally:
+                await game_server.close()
+
+        asyncio.run(play())
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_batch_env(self):
+        # Test that stepping a batch of boards with random moves, including occupied cells, matches Game
+        env = vecenv.BatchEnv(50)
+        games = [Game("player 1", "player 2") for _ in range(50)]
+        rng = numpy.random.default_rng(0)
+        for _ in range(20):
+            moves = rng.integers(vecenv.NO_MOVE, 9, 50)
+            applied = env.step(moves)
+            for i, game in enumerate(games):
+                if game.status != IN_PROGRESS or moves[i] == vecenv.NO_MOVE:
+                    self.assertFalse(applied[i], "Applied a move to a finished board or a board with no move")
+                    continue
+                row, col = divmod(int(moves[i]), 3)
+                self.assertEqual(applied[i], game.bitboard.is_empty(row, col), "Applied a move to an occupied cell")
+                if applied[i]:
+                    game.update_board(row, col)
+                    game.move_count += 1
+                    game.status = game.check_status(row, col)
+                    game.cur_player = game.alternate_player()
+                self.assertEqual(env.status[i], game.status, "Batch status differs from check_status")
+                self.assertEqual(env.board(i), game.bitboard, "Batch board differs from update_board")
+
+        # Test that legal moves are the empty cells of boards in progress
+        legal = env.legal_moves()
+        for i, game in enumerate(games):
+            expected = [game.status == IN_PROGRESS and game.bitboard.is_empty(r, c) for r in range(3) for c in range(3)]
+            self.assertEqual(list(legal[i]), expected, "Legal move mask is wrong")
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_learner(self):
+        # Test that a table trained by self-play never loses to ComputerPlayer, and that a checkpoint is read back whole
+        table = learner.ValueTable()
+        result = learner.train(table, 300000, seed=0)
+        self.assertGreaterEqual(result["games"], 300000, "Training played too few games")
+        self.assertEqual(table.games, result["games"], "Training games were not counted in the table")
+        self.assertEqual(learner.evaluate(table, 36)["losses"], 0, "Trained player lost to ComputerPlayer")
+
+        board = Board.from_rows([["X", "X", "-"], ["O", "O", "-"], ["-", "-", "-"]])
+        self.assertEqual(LearnerPlayer(0, "learner", "X", table).get_next_move(board, 4), (0, 2),
+            "Trained player did not take a winning move")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "learner.npz")
+            table.save(path)
+            loaded = learner.ValueTable.load(path)
+            self.assertTrue(numpy.array_equal(loaded.values, table.values), "Checkpoint changed the values")
+            self.assertEqual(loaded.games, table.games, "Checkpoint lost the number of training games")
+
+        # Test that positions on a board too large to give each its own entry are hashed into the table
+        table = learner.ValueTable(4, 4, hash_bits=16)
+        self.assertEqual(len(table.values), 1 << 16, "Hashed table has the wrong size")
+        learner.train(table, 1000, batch_size=100, seed=0)
+        self.assertIn(LearnerPlayer(0, "learner", "X", table).get_next_move(Board(geometry=get_geometry(4, 4)), 0),
+            [divmod(cell, 4) for cell in range(16)], "Hashed table chose an invalid move")
+
 if __name__ == "__main__":
     unittest.main()
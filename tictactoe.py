@@ -1,48 +1,304 @@
+import itertools
+import time
+from collections import namedtuple
+
+from bitboard import Board, get_geometry, STANDARD
 from players import HumanPlayer, ComputerPlayer
 
 IN_PROGRESS = 1
 WON = 2
 DRAW = 3
 
-MAX_NUM_MOVES = 9
+MAX_NUM_MOVES = 9  # The number of moves in a full game on the standard 3x3 board
+
+LARGE_BOARD_TIME_LIMIT = 1.0  # The default number of seconds a computer player may spend on each move on boards other than 3x3
+
+STATUS_NAMES = {IN_PROGRESS: "in_progress", WON: "won", DRAW: "draw"}
+
+game_numbers = itertools.count(1)  # Numbers the games played in this process, so telemetry events can be told apart by game
+
+
+class GameState(namedtuple("GameState", ("x_mask", "o_mask", "geometry", "move_count", "status"))):
+    """
+    An immutable snapshot of a game: the bitboard of each player, the Geometry of the board, the number of moves played
+    and the status. A state is a tuple, so it is hashable, small, and can be shared between searches, threads and
+    processes without copying. apply() returns the state after a move and leaves the original unchanged
+    """
+    __slots__ = ()
+
+    def __new__(cls, x_mask=0, o_mask=0, geometry=STANDARD, move_count=0, status=IN_PROGRESS):
+        return super().__new__(cls, x_mask, o_mask, geometry, move_count, status)
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        :param board: A Board
+        :return: The state of board, with the move count and status read from the board
+        """
+        geometry = board.geometry
+        move_count = bin(board.x_mask | board.o_mask).count("1")
+        if geometry.has_line(board.x_mask) or geometry.has_line(board.o_mask):
+            status = WON
+        elif move_count == geometry.num_cells:
+            status = DRAW
+        else:
+            status = IN_PROGRESS
+        return cls(board.x_mask, board.o_mask, geometry, move_count, status)
+
+    @property
+    def letter_to_move(self):
+        return "X" if self.move_count % 2 == 0 else "O"
+
+    def apply(self, cell):
+        """
+        Plays a move for the player to move. Only the win lines through cell are checked, so this takes constant time
+        :param cell: The index of the cell to play, numbered row by row from the top left
+        :return: The GameState after the move
+        :raises ValueError: If the game is over, or the cell is off the board or already played
+        """
+        geometry = self.geometry
+        if self.status != IN_PROGRESS:
+            raise ValueError("The game is over")
+        if not 0 <= cell < geometry.num_cells:
+            raise ValueError("That location is not on the board")
+        bit = geometry.cell_bits[cell]
+        if (self.x_mask | self.o_mask) & bit:
+            raise ValueError("That location has already been played")
+        x_mask, o_mask = self.x_mask, self.o_mask
+        if self.move_count % 2 == 0:
+            x_mask |= bit
+            won = geometry.completes_line(x_mask, cell)
+        else:
+            o_mask |= bit
+            won = geometry.completes_line(o_mask, cell)
+        move_count = self.move_count + 1
+        status = WON if won else DRAW if move_count == geometry.num_cells else IN_PROGRESS
+        return GameState(x_mask, o_mask, geometry, move_count, status)
+
+    def legal_cells(self):
+        """
+        :return: A list of the unoccupied cells, or an empty list if the game is over
+        """
+        if self.status != IN_PROGRESS:
+            return []
+        occupied = self.x_mask | self.o_mask
+        return [cell for cell, bit in enumerate(self.geometry.cell_bits) if not occupied & bit]
+
+    def to_board(self):
+        """
+        :return: A new Board holding this state's position
+        """
+        return Board(self.x_mask, self.o_mask, self.geometry)
 
 
 class Game:
     """
     A class to represent a Tic Tac Toe board with methods to play the game
     """
-    def __init__(self, name_1=None, name_2=None):
-        self.board = [["-", "-", "-"], ["-", "-", "-"], ["-", "-", "-"]]  # Represents the board as a 3x3 matrix of characters, either '-', 'X', or 'O'
-        self.players = self.get_players(name_1, name_2)  # An array storing the two players as Player instances
+    def __init__(self, name_1=None, name_2=None, rows=3, cols=3, win_length=None, time_limit=None, ponder=False):
+        """
+        :param name_1: The name of player 1, or None to ask for it. "cpu" makes a computer player
+        :param name_2: The name of player 2, or None to ask for it. "cpu" makes a computer player
+        :param rows: The number of rows on the board
+        :param cols: The number of columns on the board
+        :param win_length: The number of the same letter in a row, column or diagonal needed to win. Defaults to the shorter side
+        :param time_limit: The number of seconds a computer player may spend on each move. Defaults to no limit on the
+                           3x3 board, where the full search is fast, and to LARGE_BOARD_TIME_LIMIT on other boards
+        :param ponder: If True, computer players search their replies while a human player chooses a move (see
+                       ComputerPlayer.start_pondering), so they answer the moves they pondered without searching
+        """
+        self.geometry = get_geometry(rows, cols, win_length)  # The shape of the board and its win lines
+        if time_limit is None and self.geometry is not STANDARD:
+            time_limit = LARGE_BOARD_TIME_LIMIT
+        self.time_limit = time_limit  # The time budget passed to computer players
+        self.ponder = ponder  # Whether computer players ponder during a human player's turn
+        self.bitboard = Board(geometry=self.geometry)  # Represents the board as one bitboard per player. The matrix view is available as self.board
+        self.players = self.get_players(name_1, name_2, self.time_limit, self.ponder)  # An array storing the two players as Player instances
         self.status = IN_PROGRESS  # Represents the status of the game as one of the constants IN_PROGRESS, WON, DRAW
-        self.move_count = 0  # Represents the number of moves played already. Once move_count = MAX_NUM_MOVES, the game is over
+        self.move_count = 0  # Represents the number of moves played already. Once every cell is occupied, the game is over
         self.cur_player = self.players[0]  # Player instance representing the index of the current player in the players array. Player 1 is first
+        self.history = [GameState(geometry=self.geometry)]  # The GameState after every move played so far, starting with the empty board
+        self.undone = []  # The states taken back by undo(), the most recently taken back last, which redo() plays again
+        self.sinks = []  # The telemetry sinks that receive the events of this game. See add_sink
+        self.game_number = 0  # The number of the game being played in this process, set when play_game starts
+        self.start_time = 0.0  # The time.perf_counter() value at which play_game started
 
-    def play_game(self):
+    def add_sink(self, sink):
+        """
+        Sends the events of this game to a telemetry sink (see telemetry.py). A sink is any object with a handle(event)
+        method, which is called with a dict holding the event name under "event", the time.time() under "time", the
+        game_number under "game", and fields that depend on the event:
+
+            game_start        players (the type of each player)
+            move_requested    letter, player_type, move_count
+            move_chosen       letter, player_type, row, col, seconds (the time spent in get_next_move)
+            invalid_move      letter, player_type, row, col (the move was to an occupied cell and is asked for again)
+            move_applied      letter, row, col, move_count
+            game_end          status, winner (a letter or None), moves, seconds
+
+        No events are built when a game has no sinks
+        """
+        self.sinks.append(sink)
+
+    def emit(self, event, **fields):
+        """
+        Sends an event to every sink. Callers check self.sinks first so that games without sinks do no work
+        """
+        fields["event"] = event
+        fields["time"] = time.time()
+        fields["game"] = self.game_number
+        for sink in self.sinks:
+            sink.handle(fields)
+
+    @property
+    def state(self):
+        """
+        The GameState of the current position
+        """
+        return self.history[-1]
+
+    @property
+    def board(self):
+        """
+        A new matrix of characters, either '-', 'X', or 'O', representing the board. Modifying the returned
+        matrix does not modify the game; assign a whole matrix to self.board instead
+        """
+        return self.bitboard.to_rows()
+
+    @board.setter
+    def board(self, rows):
+        self.bitboard = Board.from_rows(rows, self.geometry.win_length)
+        self.geometry = self.bitboard.geometry
+        self.history = [GameState.from_board(self.bitboard)]  # Moves before an assigned board cannot be undone
+        self.undone = []
+
+    def play_game(self, verbose=True, recorder=None):
         """
         The top-level controller for a Tic Tac Toe game
         While the status of the Game object = IN_PROGRESS, the game is still in play
         The controller will get the next move, update the board corresponding to that move, check if the game is over, and alternate to the next player
         Once the game is over, output the winner of the game, or output that it ended in a draw
+        :param verbose: If False, nothing is printed
+        :param recorder: An optional RecordWriter (see records.py) that the finished game is written to
+        :return: The winning Player, or None if the game ended in a draw
         """
-        print("Beginning new game.")
-        while self.status == IN_PROGRESS:  # While the game is still in progress, execute another move
-            self.print_board()  # Print the board so the player can see the board before moving
-            print("\n" + self.cur_player.name + "'s turn.")
-            row, col = self.cur_player.get_next_move(self.board, self.move_count)  # Get the row and col of cur_player's next move
-            self.update_board(row, col)  # Make sure the next move is valid and then update the board
-            self.move_count += 1
-            self.status = self.check_status(row, col)  # Check if the game has ended
-            self.cur_player = self.alternate_player()  # Iterate to the next player
+        if verbose:
+            print("Beginning new game.")
+        self.game_number = next(game_numbers)
+        self.start_time = time.perf_counter()
+        if self.sinks:
+            self.emit("game_start", players=[type(player).__name__ for player in self.players])
+        try:
+            while self.status == IN_PROGRESS:  # While the game is still in progress, execute another move
+                if self.cur_player.is_human:  # Let the other player use the time the human spends choosing
+                    self.alternate_player().start_pondering(self.bitboard, self.move_count)
+                if verbose:
+                    self.print_board()  # Print the board so the player can see the board before moving
+                    print("\n" + self.cur_player.name + "'s turn.")
+                self.play_move()
+        finally:
+            for player in self.players:
+                player.stop_pondering()
 
         # The game is no longer in progress. Execute code to end the game
-        winning_player = self.alternate_player()  # The winning player is the player who made the last move. cur_player currently refers to the other player because cur_player was iterated at the end of the while loop, so iterate again to get the winning player
-        if self.status == WON:
-            print(winning_player.name + " has won the game.")
-        else:
-            print("The game ended in a draw")
-        print("The final configuration of the board is: ")
-        self.print_board()
+        winning_player = self.alternate_player() if self.status == WON else None  # The winning player is the player who made the last move. cur_player currently refers to the other player because cur_player was iterated at the end of the while loop, so iterate again to get the winning player
+        if verbose:
+            if winning_player is not None:
+                print(winning_player.name + " has won the game.")
+            else:
+                print("The game ended in a draw")
+            print("The final configuration of the board is: ")
+            self.print_board()
+        if self.sinks:
+            self.emit("game_end", status=STATUS_NAMES[self.status], winner=None if winning_player is None else winning_player.letter,
+                      moves=self.move_count, seconds=time.perf_counter() - self.start_time)
+        if recorder is not None:
+            recorder.write_game(self)
+        return winning_player
+
+    def play_move(self):
+        """
+        Plays a single move: gets the current player's next move, updates the board, checks if the move ended the game,
+        and alternates to the next player
+        :return: The zero-indexed row and col of the move that was played
+        """
+        row, col = self.request_move()  # Get the row and col of cur_player's next move
+        row, col = self.update_board(row, col)  # Make sure the next move is valid and then update the board
+        self.end_move(row, col)
+        return row, col
+
+    def request_move(self):
+        """
+        Asks the current player for its next move, reporting the request and the time the player took to telemetry sinks
+        :return: The zero-indexed row and col chosen by the player
+        """
+        player = self.cur_player
+        if not self.sinks:
+            return player.get_next_move(self.bitboard, self.move_count)
+        player_type = type(player).__name__
+        self.emit("move_requested", letter=player.letter, player_type=player_type, move_count=self.move_count)
+        start = time.perf_counter()
+        row, col = player.get_next_move(self.bitboard, self.move_count)
+        self.emit("move_chosen", letter=player.letter, player_type=player_type, row=row, col=col, seconds=time.perf_counter() - start)
+        return row, col
+
+    def apply_move(self, row, col):
+        """
+        Plays a move for the current player that was chosen outside the game, for example received over a network,
+        instead of asking the player for it
+        :param row: The zero-indexed row of the move
+        :param col: The zero-indexed col of the move
+        :raises ValueError: If the game is over, or the location is off the board or already played
+        """
+        if self.status != IN_PROGRESS:
+            raise ValueError("The game is over")
+        if not (0 <= row < self.geometry.rows and 0 <= col < self.geometry.cols):
+            raise ValueError("That location is not on the board")
+        if not self.bitboard.is_empty(row, col):
+            raise ValueError("That location has already been played")
+        self.bitboard.place(row, col, self.cur_player.letter)
+        self.end_move(row, col)
+
+    def end_move(self, row, col):
+        """
+        Finishes a move that has been entered on the board: counts it, checks if it ended the game, and alternates to the next player
+        """
+        self.move_count += 1
+        if self.sinks:
+            self.emit("move_applied", letter=self.cur_player.letter, row=row, col=col, move_count=self.move_count)
+        self.status = self.check_status(row, col)  # Check if the game has ended
+        self.cur_player = self.alternate_player()  # Iterate to the next player
+        self.history.append(GameState(self.bitboard.x_mask, self.bitboard.o_mask, self.geometry, self.move_count, self.status))
+        self.undone = []  # A new move replaces the moves that were taken back
+
+    def undo(self):
+        """
+        Takes back the last move. The move can be played again with redo() until a different move is played
+        :raises ValueError: If no move has been played
+        """
+        if len(self.history) == 1:
+            raise ValueError("There is no move to undo")
+        self.undone.append(self.history.pop())
+        self.restore(self.history[-1])
+
+    def redo(self):
+        """
+        Plays the last move taken back by undo() again
+        :raises ValueError: If there is no move to redo
+        """
+        if not self.undone:
+            raise ValueError("There is no move to redo")
+        self.history.append(self.undone.pop())
+        self.restore(self.history[-1])
+
+    def restore(self, state):
+        """
+        Sets the board, move count, status and current player to those of a GameState
+        """
+        self.bitboard = state.to_board()
+        self.move_count = state.move_count
+        self.status = state.status
+        self.cur_player = self.players[state.move_count % 2]  # Player 1 moves first, so the move count decides whose turn it is
 
     def update_board(self, row, col):
         """
@@ -50,14 +306,18 @@ class Game:
         occupied, it will continue to ask for the row and column again until an unoccupied location is chosen
         :param row: The zero-indexed row where the player wants to move on the board
         :param col: The zero-indexed col where the player wants to move on the board
+        :return: The row and col that were updated, which differ from the inputs if the inputted location was occupied
         """
-        if self.board[row][col] == "-":  # Determine if the inputted cell is unoccupied
-            self.board[row][col] = self.cur_player.letter  # Upate the inputted cell with the current player's letter
+        if self.bitboard.is_empty(row, col):  # Determine if the inputted cell is unoccupied
+            self.bitboard.place(row, col, self.cur_player.letter)  # Upate the inputted cell with the current player's letter
+            return row, col
 
         else:  # If the inputted cell is occupied, continue to ask for a new location until a valid one is provided
             print("That location has already been played. Please enter an unoccupied location")
-            row, col = self.cur_player.get_next_move(self.board, self.move_count)
-            self.update_board(row, col)
+            if self.sinks:
+                self.emit("invalid_move", letter=self.cur_player.letter, player_type=type(self.cur_player).__name__, row=row, col=col)
+            row, col = self.request_move()
+            return self.update_board(row, col)
 
     def print_board(self):
         """
@@ -69,29 +329,18 @@ class Game:
     def check_status(self, last_row, last_col):
         """
         Checks if the most recent move ended the game either by a draw or one of the players winning
-        :param last_row: The zero-indexed row where the most recent player moved. Must be either 0, 1, or 2
-        :param last_col: The zero-indexed col where the most recent player moved. Must be either 0, 1, or 2
+        :param last_row: The zero-indexed row where the most recent player moved
+        :param last_col: The zero-indexed col where the most recent player moved
         :return: 1 if the game in still in progress, 2 if the most recent move won the game or 3 if the most recent
                  move filled the board and its a draw
         """
-        # Check if the row of the last move has 3 of a kind
-        if self.board[last_row][0] == self.board[last_row][1] == self.board[last_row][2] == self.board[last_row][last_col]:
-            return WON
-
-        # Check if the col of the last move has 3 of a kind
-        elif self.board[0][last_col] == self.board[1][last_col] == self.board[2][last_col] == self.board[last_row][last_col]:
-            return WON
-
-        # Check the diagonal from top-left to bottom-right
-        if self.board[0][0] == self.board[1][1] == self.board[2][2] == self.board[last_row][last_col]:
-            return WON
-
-        # Check the diagonal from top-right to bottom-left
-        if self.board[2][0] == self.board[1][1] == self.board[0][2] == self.board[last_row][last_col]:
+        # Check the row, the col and any diagonal through the last move for a complete line of the last move's letter
+        letter = self.bitboard.get(last_row, last_col)
+        if letter != "-" and self.bitboard.completes_line(self.geometry.cell_index(last_row, last_col), letter):
             return WON
 
         # At this point, the game is either still in progress or a draw, so check if the board is filled
-        if self.move_count == MAX_NUM_MOVES:
+        if self.move_count == self.geometry.num_cells:
             return DRAW
 
         # If nobody won and it isn't a draw, the game must still be in progress. Return the current status, which is 1.
@@ -111,30 +360,34 @@ class Game:
         Reset the board to prepare for a new game
         """
         if self.status != 1:  # If this is the first game, do not ask for the player's names again
-            self.players = self.get_players(name_1, name_2)
+            self.players = self.get_players(name_1, name_2, self.time_limit, self.ponder)
 
-        self.board = [["-", "-", "-"], ["-", "-", "-"], ["-", "-", "-"]]
+        self.bitboard = Board(geometry=self.geometry)
         self.status = IN_PROGRESS
         self.move_count = 0
         self.cur_player = self.players[0]
+        self.history = [GameState(geometry=self.geometry)]
+        self.undone = []
 
     @staticmethod
-    def get_players(name_1=None, name_2=None):
+    def get_players(name_1=None, name_2=None, time_limit=None, ponder=False):
         """
         Create the two players as Player instances.
         Players are either HumanPlayer or ComputerPlayer depending on their name
+        :param time_limit: The number of seconds a ComputerPlayer may spend on each move, or None to search to the end of the game
+        :param ponder: Whether a ComputerPlayer searches its replies during the opponent's turn
         """
         if name_1 is None:
             name_1 = input("Please enter the name of player 1. For a computer player, enter cpu: ")
         if name_1 == "cpu":
-            player_1 = ComputerPlayer(0, name_1, "X")
+            player_1 = ComputerPlayer(0, name_1, "X", time_limit=time_limit, ponder=ponder)
         else:
             player_1 = HumanPlayer(0, name_1, "X")
 
         if name_2 is None:
             name_2 = input("Please enter the name of player 2. For a computer player, enter cpu: ")
         if name_2 == "cpu":
-            player_2 = ComputerPlayer(1, name_2, "O")
+            player_2 = ComputerPlayer(1, name_2, "O", time_limit=time_limit, ponder=ponder)
         else:
             player_2 = HumanPlayer(1, name_2, "O")
 
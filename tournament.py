@@ -0,0 +1,236 @@
+import argparse
+import json
+import multiprocessing
+import time
+
+import solved
+from players import ComputerPlayer, MCTSPlayer, RandomPlayer
+from tictactoe import Game, IN_PROGRESS, WON
+
+"""
+A headless runner that plays many games between two player types across a pool of worker processes
+
+Games are split into chunks. Each worker process creates its players once and plays whole chunks with no console
+input or output, so transposition tables and solved-position tables stay warm between games. Only the aggregated
+result of each chunk is sent back to the parent process. Run it from the command line with, for example
+
+    python3 tournament.py cpu random --games 100000
+"""
+
+PLAYER_TYPES = ("cpu", "table", "random", "mcts")
+MAX_CHUNK_SIZE = 1000  # The largest number of games a worker plays before reporting back
+CHUNKS_PER_PROCESS = 4  # Smaller chunks than games / processes keep every process busy until the end of the run
+
+
+def create_player(kind, id, letter, time_limit=None, seed=None):
+    """
+    Creates a player of the given type
+    :param kind: One of PLAYER_TYPES. "cpu" searches with minimax, "table" reads moves from the solved-position table
+                 (build it first with solved.py), "random" moves to random unoccupied cells, and "mcts" searches with
+                 Monte Carlo tree search
+    :param id: The index of the player in Game.players
+    :param letter: The letter of the player, either 'X' or 'O'
+    :param time_limit: The number of seconds a searching player may spend on each move, or None for a "cpu" or "table"
+                       player to search to the end of the game and an "mcts" player to run its default number of
+                       playouts. play_games passes the limit Game resolves, so None only reaches here on 3x3 boards
+    :param seed: The seed of a random or "mcts" player
+    :return: A Player instance
+    """
+    if kind == "cpu":
+        return ComputerPlayer(id, kind, letter, time_limit=time_limit)
+    if kind == "table":
+        return ComputerPlayer(id, kind, letter, solved_table=solved.load(), time_limit=time_limit)
+    if kind == "random":
+        return RandomPlayer(id, kind, letter, seed=seed)
+    if kind == "mcts":
+        return MCTSPlayer(id, kind, letter, time_limit_ms=None if time_limit is None else time_limit * 1000, seed=seed)
+    raise ValueError("Unknown player type " + str(kind) + ". Valid player types are " + ", ".join(PLAYER_TYPES))
+
+
+class TournamentResult:
+    """
+    A class to represent the aggregated results of a number of games. Index 0 of each list refers to player 1, who
+    plays 'X', and index 1 refers to player 2, who plays 'O'
+    """
+    def __init__(self):
+        self.games = 0
+        self.wins = [0, 0]
+        self.draws = 0
+        self.moves = [0, 0]  # The number of moves each player made
+        self.move_time = [0.0, 0.0]  # The total number of seconds each player spent in get_next_move
+        self.nodes_searched = [0, 0]  # The total number of positions each player's minimax visited
+        self.elapsed = 0.0  # The wall-clock seconds the run has taken so far. Only set by the runner
+
+    def merge(self, other):
+        """
+        Adds the counts of another TournamentResult to this one
+        """
+        self.games += other.games
+        self.draws += other.draws
+        for i in range(2):
+            self.wins[i] += other.wins[i]
+            self.moves[i] += other.moves[i]
+            self.move_time[i] += other.move_time[i]
+            self.nodes_searched[i] += other.nodes_searched[i]
+
+    def losses(self, player):
+        """
+        :param player: 0 for player 1 or 1 for player 2
+        """
+        return self.wins[1 - player]
+
+    def average_move_latency(self, player=None):
+        """
+        :param player: 0 for player 1, 1 for player 2, or None for both players together
+        :return: The average number of seconds spent in get_next_move per move
+        """
+        players = (0, 1) if player is None else (player,)
+        moves = sum(self.moves[i] for i in players)
+        return sum(self.move_time[i] for i in players) / moves if moves else 0.0
+
+    def total_nodes_searched(self):
+        return sum(self.nodes_searched)
+
+    def as_dict(self):
+        return {
+            "games": self.games,
+            "wins": list(self.wins),
+            "draws": self.draws,
+            "losses": [self.losses(0), self.losses(1)],
+            "average_move_latency": [self.average_move_latency(0), self.average_move_latency(1)],
+            "nodes_searched": list(self.nodes_searched),
+            "elapsed": self.elapsed,
+            "games_per_second": self.games / self.elapsed if self.elapsed else 0.0,
+        }
+
+
+def play_games(config, first_game, num_games):
+    """
+    Plays a chunk of games with no console input or output
+    :param config: A dict with the keys player_1, player_2, rows, cols, win_length, time_limit and seed
+    :param first_game: The index of the first game of the chunk, used to seed random players reproducibly
+    :param num_games: The number of games to play
+    :return: A TournamentResult for the chunk
+    """
+    seed = config["seed"]
+    # Game turns a time limit of None into LARGE_BOARD_TIME_LIMIT on boards other than 3x3, so the players get the
+    # limit of a Game rather than the configured one
+    time_limit = Game("cpu", "cpu", config["rows"], config["cols"], config["win_length"], config["time_limit"]).time_limit
+    players = [
+        create_player(config["player_1"], 0, "X", time_limit, None if seed is None else seed + 2 * first_game),
+        create_player(config["player_2"], 1, "O", time_limit, None if seed is None else seed + 2 * first_game + 1),
+    ]
+    result = TournamentResult()
+    for _ in range(num_games):
+        game = Game("cpu", "cpu", config["rows"], config["cols"], config["win_length"], time_limit)  # Names are given so nothing is asked
+        game.players = players
+        game.cur_player = players[0]
+        while game.status == IN_PROGRESS:
+            player = game.cur_player
+            nodes = getattr(player, "nodes_searched", 0)
+            start = time.perf_counter()
+            game.play_move()
+            result.move_time[player.id] += time.perf_counter() - start
+            result.moves[player.id] += 1
+            result.nodes_searched[player.id] += getattr(player, "nodes_searched", 0) - nodes
+        result.games += 1
+        if game.status == WON:
+            result.wins[game.alternate_player().id] += 1  # The player who made the last move won
+        else:
+            result.draws += 1
+    return result
+
+
+worker_config = None  # The config of the tournament run by this worker process, set by init_worker
+
+
+def init_worker(config):
+    global worker_config
+    worker_config = config
+
+
+def play_chunk(chunk):
+    """
+    Plays one chunk of games in a worker process
+    :param chunk: A tuple of the index of the first game and the number of games
+    """
+    return play_games(worker_config, chunk[0], chunk[1])
+
+
+def stream_tournament(player_1, player_2, num_games, processes=None, chunk_size=None, rows=3, cols=3, win_length=None,
+                      time_limit=None, seed=0):
+    """
+    Plays num_games games between two player types across a pool of worker processes, yielding the aggregated results
+    as chunks of games finish
+
+    :param player_1: The type of player 1, who plays 'X'. One of PLAYER_TYPES
+    :param player_2: The type of player 2, who plays 'O'. One of PLAYER_TYPES
+    :param num_games: The number of games to play
+    :param processes: The number of worker processes. Defaults to the number of cores. With 1, games are played in this process
+    :param chunk_size: The number of games a worker plays before reporting back. Defaults to a size that gives every
+                       process several chunks
+    :param rows: The number of rows on the board
+    :param cols: The number of columns on the board
+    :param win_length: The number in a row needed to win. Defaults to the shorter side of the board
+    :param time_limit: The number of seconds a searching player may spend on each move. Defaults to the limit Game uses:
+                       a full search on the 3x3 board and LARGE_BOARD_TIME_LIMIT on other boards
+    :param seed: The base seed of random players, or None for unseeded games
+    :return: A generator of TournamentResult instances, each including every game finished so far. The last one
+             covers the whole tournament
+    """
+    for kind in (player_1, player_2):
+        if kind not in PLAYER_TYPES:
+            raise ValueError("Unknown player type " + str(kind) + ". Valid player types are " + ", ".join(PLAYER_TYPES))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, min(MAX_CHUNK_SIZE, -(-num_games // (processes * CHUNKS_PER_PROCESS))))
+    config = {"player_1": player_1, "player_2": player_2, "rows": rows, "cols": cols, "win_length": win_length,
+              "time_limit": time_limit, "seed": seed}
+    chunks = [(first, min(chunk_size, num_games - first)) for first in range(0, num_games, chunk_size)]
+
+    start = time.perf_counter()
+    total = TournamentResult()
+    if processes == 1:
+        for first, size in chunks:
+            total.merge(play_games(config, first, size))
+            total.elapsed = time.perf_counter() - start
+            yield total
+        return
+
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(config,)) as pool:
+        for result in pool.imap_unordered(play_chunk, chunks):
+            total.merge(result)
+            total.elapsed = time.perf_counter() - start
+            yield total
+
+
+def run_tournament(player_1, player_2, num_games, **kwargs):
+    """
+    Plays a whole tournament and returns its TournamentResult. Takes the same arguments as stream_tournament()
+    """
+    total = TournamentResult()
+    for total in stream_tournament(player_1, player_2, num_games, **kwargs):
+        pass
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many headless games between two player types")
+    parser.add_argument("player_1", choices=PLAYER_TYPES, help="The type of player 1, who plays X")
+    parser.add_argument("player_2", choices=PLAYER_TYPES, help="The type of player 2, who plays O")
+    parser.add_argument("--games", type=int, default=1000, help="The number of games to play")
+    parser.add_argument("--processes", type=int, default=None, help="The number of worker processes. Defaults to the number of cores")
+    parser.add_argument("--chunk-size", type=int, default=None, help="The number of games per chunk of work")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--win-length", type=int, default=None)
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds per move for searching players. Defaults to a full search on 3x3 boards and "
+                        "to the limit Game uses on other boards")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = run_tournament(args.player_1, args.player_2, args.games, processes=args.processes,
+                            chunk_size=args.chunk_size, rows=args.rows, cols=args.cols, win_length=args.win_length,
+                            time_limit=args.time_limit, seed=args.seed)
+    print(json.dumps(result.as_dict(), indent=2))
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+EXACT = 0  # The stored value is the exact minimax value of the position
+LOWER = 1  # The search failed high, so the true value is at least the stored value
+UPPER = 2  # The search failed low, so the true value is at most the stored value
+
+DEFAULT_CAPACITY = 1 << 16
+
+
+def position_key(to_move, waiting, geometry):
+    """
+    Creates the transposition table key of a position from the side to move's perspective
+    The side to move has as many pieces as the other side when 'X' is to move and one fewer when 'O' is to move,
+    so the key is unique without storing whose turn it is, and it is the same no matter which letter is to move
+    :param to_move: The mask of the cells occupied by the player to move
+    :param waiting: The mask of the cells occupied by the other player
+    :param geometry: The Geometry of the board. Positions on different geometries get different keys
+    :return: An integer key
+    """
+    num_cells = geometry.num_cells
+    return to_move | (waiting << num_cells) | (geometry.index << (2 * num_cells))
+
+
+class TranspositionTable:
+    """
+    A class to represent a bounded cache of searched positions. Each entry records the value of a position from the
+    perspective of the player to move, the best move found, the depth it was searched to and whether the value is
+    exact or a bound. When the table is full the least recently used entry is evicted
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        :param capacity: The maximum number of entries kept in the table
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.entries = OrderedDict()  # Maps a position key to a (depth, value, cell, bound) tuple, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """
+        :param key: A key created with position_key()
+        :return: The (depth, value, cell, bound) tuple stored for key, or None if there is none
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, value, cell, bound):
+        """
+        Records the result of searching a position, evicting the least recently used entry if the table is full
+        :param key: A key created with position_key()
+        :param depth: The number of moves searched below the position
+        :param value: The value of the position from the perspective of the player to move
+        :param cell: The index of the best cell found, or -1 if there is none
+        :param bound: One of EXACT, LOWER or UPPER
+        """
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+        entries[key] = (depth, value, cell, bound)
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+SHARED_TABLE = TranspositionTable()  # The table shared by every ComputerPlayer in this process unless one is given explicitly
@@ -0,0 +1,134 @@
+import numpy as np
+
+from bitboard import Board, get_geometry
+from tictactoe import IN_PROGRESS, WON, DRAW
+
+"""
+A vectorized environment that holds many boards in NumPy arrays and steps all of them at once
+
+Every board is stored as two bitboards, like bitboard.Board, in arrays of unsigned 64 bit integers, so boards with up
+to 64 cells are supported. Moves are cell indices, numbered row by row from the top left. The rules match
+Game.update_board and Game.check_status: a move to an occupied cell is not applied and the same player must move again,
+a board is won when the move completes a win line for the player who made it, and drawn when the last cell is filled
+"""
+
+NO_MOVE = -1  # A move that leaves its board unchanged, for boards that should not be stepped
+LINE_TABLE_MAX_CELLS = 16  # Boards with at most this many cells find complete lines with a table of every mask
+
+
+class BatchEnv:
+    """
+    A class to represent num_boards independent games. Player 1 plays 'X' and moves first on every board
+    """
+    def __init__(self, num_boards, rows=3, cols=3, win_length=None):
+        """
+        :param num_boards: The number of boards
+        :param rows: The number of rows on each board
+        :param cols: The number of columns on each board
+        :param win_length: The number in a row needed to win. Defaults to the shorter side of the board
+        """
+        self.geometry = get_geometry(rows, cols, win_length)
+        if self.geometry.num_cells > 64:
+            raise ValueError("BatchEnv supports boards with at most 64 cells")
+        self.num_boards = num_boards
+        self.win_masks = np.array(self.geometry.win_masks, dtype=np.uint64)
+        self.cell_bits = np.array(self.geometry.cell_bits, dtype=np.uint64)
+        self.line_table = None  # line_table[mask] is True if mask contains a complete win line, on small boards
+        if self.geometry.num_cells <= LINE_TABLE_MAX_CELLS:
+            self.line_table = self.lines_complete(np.arange(1 << self.geometry.num_cells, dtype=np.uint64))
+        self.x_masks = np.zeros(num_boards, dtype=np.uint64)
+        self.o_masks = np.zeros(num_boards, dtype=np.uint64)
+        self.move_count = np.zeros(num_boards, dtype=np.int32)
+        self.status = np.full(num_boards, IN_PROGRESS, dtype=np.int8)  # IN_PROGRESS, WON or DRAW for every board
+
+    def reset(self, done=None):
+        """
+        Empties boards so new games can start on them
+        :param done: An optional boolean array selecting the boards to reset. Defaults to every board
+        """
+        if done is None:
+            done = slice(None)
+        self.x_masks[done] = 0
+        self.o_masks[done] = 0
+        self.move_count[done] = 0
+        self.status[done] = IN_PROGRESS
+
+    def x_to_move(self):
+        """
+        :return: A boolean array that is True for the boards where 'X' is to move
+        """
+        return self.move_count % 2 == 0
+
+    def legal_moves(self):
+        """
+        :return: A boolean array of shape (num_boards, num_cells) that is True for every unoccupied cell of a board that
+                 is still in progress
+        """
+        occupied = self.x_masks | self.o_masks
+        empty = (occupied[:, None] & self.cell_bits[None, :]) == 0
+        return empty & (self.status == IN_PROGRESS)[:, None]
+
+    def step(self, moves):
+        """
+        Plays one move on every board
+        :param moves: An integer array with one cell index per board. Use NO_MOVE to leave a board unchanged
+        :return: A boolean array that is True for the boards where the move was applied. A move is not applied if its
+                 board is no longer in progress or its cell is occupied, in which case the same player is still to move
+        """
+        moves = np.asarray(moves)
+        if moves.shape != (self.num_boards,):
+            raise ValueError("step needs exactly one move per board")
+        on_board = (moves >= 0) & (moves < self.geometry.num_cells)
+        bits = np.where(on_board, self.cell_bits[np.where(on_board, moves, 0)], np.uint64(0))
+        occupied = self.x_masks | self.o_masks
+        applied = on_board & (self.status == IN_PROGRESS) & ((occupied & bits) == 0)
+
+        x_turn = self.x_to_move()
+        self.x_masks |= np.where(applied & x_turn, bits, np.uint64(0))
+        self.o_masks |= np.where(applied & ~x_turn, bits, np.uint64(0))
+        self.move_count += applied
+
+        mover_masks = np.where(x_turn, self.x_masks, self.o_masks)
+        won = applied & self.lines_complete(mover_masks)
+        drawn = applied & ~won & (self.move_count == self.geometry.num_cells)
+        self.status[won] = WON
+        self.status[drawn] = DRAW
+        return applied
+
+    def lines_complete(self, masks):
+        """
+        :param masks: An array of player masks
+        :return: A boolean array that is True where the mask contains a complete win line
+        """
+        if self.line_table is not None:
+            return self.line_table[masks.view(np.int64)]
+        return ((masks[:, None] & self.win_masks[None, :]) == self.win_masks[None, :]).any(axis=1)
+
+    def winners(self):
+        """
+        :return: An array with 1 where 'X' won, 2 where 'O' won, and 0 where the game is drawn or in progress
+        """
+        winners = np.zeros(self.num_boards, dtype=np.int8)
+        won = self.status == WON
+        winners[won & self.lines_complete(self.x_masks)] = 1
+        winners[won & self.lines_complete(self.o_masks)] = 2
+        return winners
+
+    def random_moves(self, rng):
+        """
+        Chooses a uniformly random legal move on every board
+        :param rng: A numpy.random.Generator
+        :return: An array of cell indices, with NO_MOVE for the boards that are no longer in progress
+        """
+        legal = self.legal_moves()
+        keys = rng.random(legal.shape)
+        keys[~legal] = -1.0
+        moves = keys.argmax(axis=1)
+        moves[~legal.any(axis=1)] = NO_MOVE
+        return moves
+
+    def board(self, index):
+        """
+        :return: The board at index as a bitboard.Board
+        """
+        return Board(int(self.x_masks[index]), int(self.o_masks[index]), self.geometry)